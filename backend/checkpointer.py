@@ -0,0 +1,206 @@
+# checkpointer.py
+import os
+import asyncio
+import inspect
+import itertools
+import logging
+import sqlite3
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+# Child of main's "orchestrator" logger, so records go through its queue handler
+logger = logging.getLogger("orchestrator.checkpointer")
+
+# Path of the LangGraph checkpoint database; unset keeps graph runs stateless
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB")
+
+# When the graph persists checkpoints: "async"/"sync" write after every node so a
+# crashed run can resume; "exit" (opt-in) batches one write per run and loses them
+CHECKPOINT_DURABILITY = os.getenv("CHECKPOINT_DURABILITY", "async")
+
+# Read-only connections serving checkpoint loads alongside the single writer
+CHECKPOINT_READERS = 4
+
+# Seconds between background WAL checkpoints
+WAL_CHECKPOINT_INTERVAL = 30
+
+# WAL lets checkpoint commits append instead of fsyncing a rollback journal,
+# and readers stop blocking the writer.
+CHECKPOINT_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=1073741824",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=5000",
+    # wal_checkpoint_loop() normally checkpoints off the request path, keeping the
+    # WAL well under this threshold (~40 MB at 4 KiB pages); the auto-checkpoint is
+    # a backstop so the WAL stays bounded if that loop falls behind or dies.
+    "PRAGMA wal_autocheckpoint=10000",
+    # Truncate the WAL back to 64 MiB after each checkpoint instead of letting it grow
+    "PRAGMA journal_size_limit=67108864",
+)
+
+# Per-connection tuning for the readers; journal_mode is a property of the file
+READER_PRAGMAS = (
+    "PRAGMA query_only=1",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=1073741824",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+class SplitSqliteSaver(AsyncSqliteSaver):
+    """AsyncSqliteSaver that writes on one connection and reads on a pool of others.
+
+    Each aiosqlite connection runs its statements one at a time behind the saver's
+    lock, so a checkpoint load would otherwise queue behind in-flight writes.
+    Under WAL the read-only connections see committed checkpoints concurrently.
+    """
+
+    def __init__(self, conn: aiosqlite.Connection, read_conns: list[aiosqlite.Connection]):
+        super().__init__(conn)
+        self.readers = [AsyncSqliteSaver(rc, serde=self.serde) for rc in read_conns]
+        self._next_reader = itertools.cycle(self.readers)
+
+    async def setup(self) -> None:
+        await super().setup()
+        # The writer created the tables; readers must not attempt DDL of their own
+        for reader in self.readers:
+            reader._has_task_path = self._has_task_path
+            reader.is_setup = True
+
+    async def aget_tuple(self, config):
+        await self.setup()
+        return await next(self._next_reader).aget_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        await self.setup()
+        reader = next(self._next_reader)
+        async for item in reader.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aclose(self) -> None:
+        for reader in self.readers:
+            await reader.conn.close()
+        await self.conn.close()
+
+
+async def _open_readers(db_path: str, count: int) -> list[aiosqlite.Connection]:
+    """Open read-only connections to an existing checkpoint DB."""
+    readers = []
+    for _ in range(count):
+        conn = await aiosqlite.connect(f"file:{db_path}?mode=ro", uri=True)
+        for pragma in READER_PRAGMAS:
+            try:
+                await conn.execute(pragma)
+            except Exception as e:
+                logger.warning(f"⚠️ Checkpoint reader {pragma} not applied: {e}")
+        readers.append(conn)
+    return readers
+
+
+async def setup_checkpointer(db_path: str | None = CHECKPOINT_DB) -> SplitSqliteSaver | None:
+    """Open the SQLite checkpointer with tuned PRAGMAs, or return None when disabled."""
+    if not db_path:
+        return None
+
+    # Created here rather than at import; a bare filename has no directory part
+    dirname = os.path.dirname(db_path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+
+    conn = await aiosqlite.connect(db_path)
+    for pragma in CHECKPOINT_PRAGMAS:
+        try:
+            await conn.execute(pragma)
+        except Exception as e:
+            # Older SQLite builds may reject some tuning knobs; defaults still work
+            logger.warning(f"⚠️ Checkpointer {pragma} not applied: {e}")
+
+    async with conn.execute("PRAGMA journal_mode") as cursor:
+        row = await cursor.fetchone()
+    journal_mode = row[0] if row else "unknown"
+
+    # Setting journal_mode has created the file, so mode=ro can open it now;
+    # the readers see the tables once the writer's setup() commits them.
+    readers = await _open_readers(db_path, CHECKPOINT_READERS)
+    checkpointer = SplitSqliteSaver(conn, readers)
+    await checkpointer.setup()
+    logger.info(
+        f"✅ Checkpointer ready: {db_path} "
+        f"(journal_mode={journal_mode}, readers={CHECKPOINT_READERS})"
+    )
+    return checkpointer
+
+
+def _passive_wal_checkpoint(db_path: str) -> tuple[int, int, int]:
+    """Run one PASSIVE checkpoint on a short-lived connection of its own."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    finally:
+        conn.close()
+
+
+async def wal_checkpoint_loop(
+    db_path: str | None = CHECKPOINT_DB, interval: float = WAL_CHECKPOINT_INTERVAL
+):
+    """Periodically fold the WAL back into the database without blocking readers or writers."""
+    last_backlog = 0
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            busy, log, checkpointed = await asyncio.to_thread(
+                _passive_wal_checkpoint, db_path
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ WAL checkpoint failed: {e}")
+            continue
+
+        backlog = log - checkpointed
+        if backlog > last_backlog:
+            logger.warning(f"⚠️ WAL backlog growing: {backlog} frames pending (busy={busy})")
+        last_backlog = backlog
+
+
+def checkpoint_db_info(db_path: str | None = CHECKPOINT_DB, limit: int = 10) -> dict:
+    """Size and recent thread ids of the checkpoint DB, read on a read-only connection."""
+    if not db_path:
+        return {"enabled": False}
+    try:
+        size = os.stat(db_path).st_size
+    except FileNotFoundError:
+        return {"enabled": True, "path": db_path, "exists": False}
+
+    # Separate read-only connection so the probe never contends with the saver's writer;
+    # thread_id leads the checkpoints primary key, so GROUP BY walks that index.
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        conn.execute("PRAGMA query_only=1")
+        rows = conn.execute(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY thread_id LIMIT ?",
+            (limit,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    return {
+        "enabled": True,
+        "path": db_path,
+        "exists": True,
+        "size_bytes": size,
+        "threads": [row[0] for row in rows],
+    }
+
+
+def durability_kwargs(compiled_graph) -> dict:
+    """ainvoke() kwargs selecting CHECKPOINT_DURABILITY, if this LangGraph supports it."""
+    if CHECKPOINT_DURABILITY not in ("exit", "async", "sync"):
+        logger.warning(f"⚠️ Unknown CHECKPOINT_DURABILITY={CHECKPOINT_DURABILITY!r}; using default")
+        return {}
+    if "durability" not in inspect.signature(compiled_graph.ainvoke).parameters:
+        logger.warning("⚠️ LangGraph has no durability option; checkpoints are written per step")
+        return {}
+    return {"durability": CHECKPOINT_DURABILITY}
@@ -0,0 +1,52 @@
+# conftest.py
+"""
+Shared pytest setup: point the app at a throwaway SQLite database before
+main (and db.py's engines) are imported by any test module.
+"""
+
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="orchestrator-tests-")
+_DB_PATH = os.path.join(_DB_DIR, "app.db")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_PATH}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("CHECKPOINT_DB", None)
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+def _drop_db_files():
+    """Close pooled connections and delete the database with its WAL files."""
+    from db import engine, async_engine
+
+    engine.dispose()
+    # Pooled aiosqlite connections belong to TestClient's loop; just drop them
+    asyncio.run(async_engine.dispose(close=False))
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(_DB_PATH + suffix)
+        except FileNotFoundError:
+            pass
+
+
+@pytest.fixture
+def db_path(monkeypatch):
+    """Path of an empty app.db; the working directory is its folder, as in production."""
+    _drop_db_files()
+    monkeypatch.chdir(_DB_DIR)
+    yield _DB_PATH
+    _drop_db_files()
+
+
+@pytest.fixture
+def client(db_path):
+    """TestClient over a freshly created schema (lifespan is not run)."""
+    import main
+    from fastapi.testclient import TestClient
+
+    main._init_schema()
+    return TestClient(main.app)
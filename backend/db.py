@@ -1,13 +1,43 @@
 # db.py
 import os
-from contextlib import contextmanager
-from sqlalchemy import create_engine
+from contextlib import contextmanager, asynccontextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from models import Session
 
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
 connect_args = {"check_same_thread": False} if DB_URL.startswith("sqlite") else {}
 engine = create_engine(DB_URL, echo=False, future=True, connect_args=connect_args)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+# Async driver for the request handlers; non-SQLite deployments set their own URL
+ASYNC_DB_URL = os.getenv("ASYNC_DATABASE_URL") or DB_URL.replace(
+    "sqlite://", "sqlite+aiosqlite://", 1
+)
+async_engine = create_async_engine(ASYNC_DB_URL, echo=False, pool_pre_ping=True)
+
+if DB_URL.startswith("sqlite"):
+    # Per-connection settings: FK enforcement (needed for ON DELETE CASCADE),
+    # WAL so API reads don't block behind writes, and a busy wait instead of SQLITE_BUSY.
+    SQLITE_PRAGMAS = (
+        "PRAGMA foreign_keys=ON",
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-64000",
+    )
+
+    @event.listens_for(engine, "connect")
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+SessionLocal = sessionmaker(
+    bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True
+)
 
 @contextmanager
 def db_session():
@@ -20,3 +50,50 @@ def db_session():
         raise
     finally:
         db.close()
+
+
+def get_db():
+    """FastAPI dependency: one pooled session per request, committed on success."""
+    with db_session() as db:
+        yield db
+
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+@asynccontextmanager
+async def async_db_session():
+    db = AsyncSessionLocal()
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+
+async def get_async_db():
+    """Async counterpart of get_db for handlers that must not block the event loop."""
+    async with async_db_session() as db:
+        yield db
+
+
+def ensure_session(db, session_id: str, title: str | None = None):
+    """Get the session row, creating it first so child rows satisfy their FK."""
+    session_obj = db.get(Session, session_id)
+    if not session_obj:
+        session_obj = Session(id=session_id, title=title, meta={})
+        db.add(session_obj)
+        db.flush()
+    return session_obj
+
+
+async def async_ensure_session(db, session_id: str, title: str | None = None):
+    """ensure_session for an AsyncSession."""
+    session_obj = await db.get(Session, session_id)
+    if not session_obj:
+        session_obj = Session(id=session_id, title=title, meta={})
+        db.add(session_obj)
+        await db.flush()
+    return session_obj
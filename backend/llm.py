@@ -1,6 +1,9 @@
 # llm.py
+import copy
+import hashlib
 import json
 import os
+from collections import OrderedDict
 from typing import Any, Dict, Optional
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
@@ -208,6 +211,22 @@ async def get_chat_model(model_name: Optional[str] = None, **kwargs) -> Any:
 
     raise RuntimeError("No available LLM API keys. Set GROQ_API_KEY or OPENROUTER_API_KEY or OPENAI_API_KEY or ANTHROPIC_API_KEY.")
 
+# Exact-match cache for deterministic (temperature 0) JSON calls, e.g. intent analysis
+_JSON_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_JSON_CACHE_SIZE = 256
+
+
+def _json_cache_key(chat_model: Any, system_prompt: str, user_prompt: str) -> Optional[str]:
+    """Fingerprint a call, or None when the model's output is not deterministic."""
+    if getattr(chat_model, "temperature", None) != 0:
+        return None
+    model_id = getattr(chat_model, "model_name", None) or getattr(chat_model, "model", None)
+    if not model_id:
+        return None
+    raw = json.dumps([type(chat_model).__name__, model_id, system_prompt, user_prompt])
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
 @traceable(name="llm_json_call", run_type="llm")
 async def call_llm_json(
     chat_model: Any, 
@@ -215,6 +234,11 @@ async def call_llm_json(
     user_prompt: str
 ) -> Optional[Dict[str, Any]]:
     """Call LLM and parse JSON response with tracing"""
+    cache_key = _json_cache_key(chat_model, system_prompt, user_prompt)
+    if cache_key and cache_key in _JSON_CACHE:
+        _JSON_CACHE.move_to_end(cache_key)
+        return copy.deepcopy(_JSON_CACHE[cache_key])
+
     try:
         messages = [
             SystemMessage(content=system_prompt),
@@ -227,13 +251,20 @@ async def call_llm_json(
         import re
         json_match = re.search(r'\{[\s\S]*\}', content)
         if json_match:
-            return json.loads(json_match.group(0))
-
-        # If no JSON found, try to parse the entire content
-        return json.loads(content)
+            result = json.loads(json_match.group(0))
+        else:
+            # If no JSON found, try to parse the entire content
+            result = json.loads(content)
     except Exception as e:
         print(f"Error parsing JSON from LLM response: {e}")
         return None
+
+    if cache_key and isinstance(result, dict):
+        _JSON_CACHE[cache_key] = copy.deepcopy(result)
+        if len(_JSON_CACHE) > _JSON_CACHE_SIZE:
+            _JSON_CACHE.popitem(last=False)
+    return result
+
 from openai import OpenAI
 import asyncio, os, time
 
@@ -1,56 +1,294 @@
 # main.py
 import os
+import sys
 import uvicorn
 import json
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import orjson
+from datetime import datetime, timezone
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    UploadFile,
+    File,
+    Form,
+    Header,
+    Depends,
+    Query,
+    BackgroundTasks,
+)
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 import zipfile
 import io
+import re
+import shlex
+import logging
+import logging.handlers
+import queue
 import tempfile
 from contextlib import asynccontextmanager
 import asyncio
+import functools
+import hashlib
 import time
 import uuid
-from typing import Dict
+from typing import Dict, NamedTuple, Optional
 from utlis.docs import save_upload_to_disk, save_logo_to_disk, save_image_to_disk
 
 
 load_dotenv()
 
 os.environ["LANGCHAIN_TRACING_V2"] = "false"
-os.environ["LANGCHAIN_PROJECT"] = os.getenv("LANGCHAIN_PROJECT", "lovable-orchestrator")
+
+# Handlers only enqueue records; the listener thread started in lifespan does the
+# blocking stream writes, so logging never stalls the event loop.
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+logger = logging.getLogger("orchestrator")
+logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+logger.propagate = False
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+
+_PROJECT = os.environ["LANGCHAIN_PROJECT"] = os.getenv(
+    "LANGCHAIN_PROJECT", "lovable-orchestrator"
+)
+_BASE_CONFIGURABLE = {"recursion_limit": 50}
+_BASE_METADATA = {"project_name": _PROJECT}
+_RESTORE_TAGS = ("api_request", "restore", "frontend")
+
+
+@functools.lru_cache(maxsize=32)
+def _request_tags(source: str, llm_model: Optional[str]) -> tuple:
+    """Static run tags for a (source, model) pair; callers add per-request ones."""
+    return ("api_request", source, f"model:{llm_model or 'default'}")
 
 from langsmith import Client
 from langchain_core.runnables import RunnableConfig
-from db import engine
-from models import Base
-from schemas import UserQueryOut
+from sqlalchemy import select, func, desc, and_, or_, delete, update, inspect as sa_inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import (
+    engine,
+    async_engine,
+    get_async_db,
+    db_session,
+    async_db_session,
+    ensure_session,
+    async_ensure_session,
+)
+from models import (
+    Base,
+    Session,
+    Message,
+    ConversationHistory,
+    SessionGeneratedLinks,
+    Logo,
+    Image,
+)
+from migrate_db import CASCADE_TABLES, _ensure_cascade
+from schemas import UserQueryOut, SessionListOut, SessionDetailsOut
 from nodes.user_query_node import user_node_init_state
 from graph import graph
-from utlis.docs import save_upload_to_disk, save_logo_to_disk, save_image_to_disk
+from checkpointer import (
+    setup_checkpointer,
+    wal_checkpoint_loop,
+    durability_kwargs,
+    checkpoint_db_info,
+)
+from nodes.apply_to_Sandbox_node import (
+    _get_session_sandbox,
+    _get_session_info,
+    _async_sandbox_command,
+    _async_sandbox_file_read,
+    _async_sandbox_file_list,
+    apply_sandbox,
+    cleanup_all_sessions,
+    cleanup_session_sandbox as _cleanup_session_sandbox,
+    get_cached_html,
+    cache_html,
+)
 
 from langserve import add_routes
 
-_running_requests: Dict[str, asyncio.Task] = {}
+# Graph runs stay in this process: run tasks, status polling and the per-session
+# sandbox handles (nodes/apply_to_Sandbox_node.py) are all process-local state.
+class _RunningRequest(NamedTuple):
+    # The graph run, or a pending placeholder future while its uploads are saved
+    task: asyncio.Future
+    # Idempotency-Key the run was started with, if any
+    idempotency_key: str | None
+
+
+_running_requests: Dict[str, _RunningRequest] = {}
+
+# Finished tasks stay pollable this long, then the status endpoint falls back to the DB
+_DONE_REQUEST_TTL_S = 600
+
+
+def _forget_request(session_id: str, task: asyncio.Future) -> None:
+    entry = _running_requests.get(session_id)
+    if entry and entry.task is task:
+        del _running_requests[session_id]
+
+
+def _on_request_done(session_id: str, task: asyncio.Task) -> None:
+    """Schedule a finished task (and the state it holds) for eviction."""
+    task.get_loop().call_later(
+        _DONE_REQUEST_TTL_S, _forget_request, session_id, task
+    )
+
+# Opt-in window in which a newer query for the same session supersedes a queued
+# one; every query waits it out, so it is off unless QUERY_COALESCE_MS is set
+_QUERY_COALESCE_S = int(os.getenv("QUERY_COALESCE_MS", "0")) / 1000
+
+# Cap on concurrent graph runs in this process; excess runs queue for a slot
+_graph_sem = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT_GRAPHS", "8")))
+
+# Extra ainvoke() kwargs (checkpoint durability) set once the checkpointer is up
+_graph_run_kwargs: Dict[str, str] = {}
+
+# Bumped whenever _upgrade_schema gains a step; stored in SQLite's PRAGMA user_version.
+# 3: child-table FKs rebuilt with ON DELETE CASCADE (v2 stamps predate that step)
+_SCHEMA_VERSION = 3
+
+
+def _ensure_indexes() -> None:
+    """Add model indexes missing from an existing DB, then refresh planner stats."""
+    # One connection for every check and CREATE; an engine-bound inspector checks
+    # a connection out per call
+    with engine.begin() as conn:
+        insp = sa_inspect(conn)
+        created = []
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {ix["name"] for ix in insp.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=conn)
+                    created.append(index.name)
+
+        if created:
+            conn.exec_driver_sql("ANALYZE")
+            logger.info(f"✅ Created indexes: {', '.join(created)}")
+
+
+# True once every child table's foreign keys cascade; until then delete_session
+# removes child rows itself (FKs are enforced, legacy tables don't cascade)
+_cascade_deletes = False
+
+
+def _ensure_cascade_fks() -> None:
+    """Rebuild legacy child tables so their foreign keys cascade."""
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        # Outside any transaction: the rebuild's DROP TABLE must neither cascade
+        # into child rows nor trip FK checks
+        cursor.execute("PRAGMA foreign_keys=OFF")
+        try:
+            cursor.execute("BEGIN")
+            for table in CASCADE_TABLES:
+                _ensure_cascade(cursor, table)
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+    finally:
+        raw.close()
+
+
+def _upgrade_schema() -> bool:
+    """Bring an existing SQLite DB up to _SCHEMA_VERSION; True once its FKs cascade.
+
+    A DB already stamped costs one PRAGMA read. The stamp is written only after
+    every step has succeeded, so a failed upgrade is retried on the next start.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() >= _SCHEMA_VERSION:
+            return True
+
+    _ensure_indexes()
+    _ensure_cascade_fks()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version={_SCHEMA_VERSION}")
+    return True
+
+
+def _init_schema() -> None:
+    """Create missing tables once; CREATE_SCHEMA=1 forces it on an existing DB."""
+    global _cascade_deletes
+    try:
+        if os.path.exists("app.db") and os.getenv("CREATE_SCHEMA") != "1":
+            _cascade_deletes = _upgrade_schema()
+            logger.info("✅ Database exists with correct schema")
+            return
+
+        logger.info("🔄 Creating database schema...")
+        Base.metadata.create_all(bind=engine)
+        # Fresh tables already cascade; this stamps the version and upgrades any
+        # legacy tables a forced CREATE_SCHEMA=1 left in place
+        _cascade_deletes = _upgrade_schema()
+        logger.info("✅ Database schema ready")
+
+    except Exception as e:
+        logger.error(f"❌ Database setup error: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handles application startup and shutdown events."""
+    global compiled_graph
+
+    _log_listener.start()
+    await asyncio.to_thread(_init_schema)
+
+    checkpointer = await setup_checkpointer()
+    wal_task = None
+    if checkpointer is not None:
+        compiled_graph = graph.compile(checkpointer=checkpointer)
+        _graph_run_kwargs.update(durability_kwargs(compiled_graph))
+        wal_task = asyncio.create_task(wal_checkpoint_loop())
+    app.state.checkpointer = checkpointer
+    app.state.graph = compiled_graph
+
+    # Registered here rather than at import so the playground routes serve the
+    # graph compiled above, checkpointer included
+    add_routes(
+        app,
+        compiled_graph.with_config(
+            configurable=_BASE_CONFIGURABLE,
+            tags=["langserve", "studio"],
+            metadata={"source": "langserve_playground"},
+        ),
+        path="/graph",
+    )
 
     yield
 
-    for session_id, task in _running_requests.items():
+    if wal_task is not None:
+        wal_task.cancel()
+
+    for session_id, (task, _key) in _running_requests.items():
 
         task.cancel()
 
     _running_requests.clear()
 
-    from nodes.apply_to_Sandbox_node import cleanup_all_sessions
+    if checkpointer is not None:
+        await checkpointer.aclose()
+
+    await async_engine.dispose()
+    if _langsmith_client is not None:
+        _langsmith_client.close()
+    _log_listener.stop()
 
 
 app = FastAPI(title="Lovable-like Orchestrator", version="0.5.0", lifespan=lifespan)
@@ -63,36 +301,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+UPLOAD_SEND_CHUNK = 1024 * 1024
 
-try:
-    import os
 
-    db_exists = os.path.exists("app.db")
+class _ImmutableStaticFiles(StaticFiles):
+    """StaticFiles for content-addressed uploads: a given URL never changes content."""
 
-    if db_exists:
-        print("✅ Database exists with correct schema")
-    else:
-        print("🔄 Creating new database...")
-        Base.metadata.create_all(bind=engine)
-        print("✅ New database created")
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        # Each chunk is a worker-thread read plus an ASGI send; 64 KiB default is small
+        response.chunk_size = UPLOAD_SEND_CHUNK
+        return response
+
+
+app.mount("/uploads", _ImmutableStaticFiles(directory="uploads", html=False), name="uploads")
+
+_UUID_RE = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE
+)
 
-except Exception as e:
-    print(f"❌ Database setup error: {e}")
+
+def _new_uuid() -> str:
+    """Fresh random UUID; kept out of the lru_cache on purpose."""
+    return str(uuid.uuid4())
 
 
 def _as_uuid(s: str | None) -> str:
     """Convert string to UUID format for LangGraph."""
     if not s:
-        from uuid import uuid4
+        return _new_uuid()
 
-        return str(uuid4())
+    return _as_uuid_cached(s)
 
-    if len(s) == 36 and s.count("-") == 4:
-        return s
 
-    import hashlib
+@functools.lru_cache(maxsize=4096)
+def _as_uuid_cached(s: str) -> str:
+    """Deterministic UUID for a session id; memoized since ids repeat every turn."""
+    if _UUID_RE.match(s):
+        return s
 
+    # Keep md5: the derived id is the LangGraph thread_id and LangSmith session key,
+    # so changing the hash would orphan existing threads for non-UUID session ids.
     hash_obj = hashlib.md5(s.encode())
     hex_dig = hash_obj.hexdigest()
 
@@ -100,6 +350,28 @@ def _as_uuid(s: str | None) -> str:
     return uuid_str
 
 
+_ts_cache: tuple[int, str] = (0, "")
+
+
+def _utc_timestamp() -> str:
+    """UTC ISO-8601 timestamp at second granularity, formatted once per second."""
+    global _ts_cache
+    now = int(time.time())
+    if _ts_cache[0] != now:
+        _ts_cache = (now, datetime.fromtimestamp(now, timezone.utc).isoformat())
+    return _ts_cache[1]
+
+
+async def _no_upload() -> None:
+    """Placeholder awaitable for an upload slot that was not sent."""
+    return None
+
+
+def _is_uuid(s: str) -> bool:
+    """Check whether a string is a canonical UUID."""
+    return isinstance(s, str) and bool(_UUID_RE.match(s))
+
+
 compiled_graph = graph.compile()
 
 
@@ -114,31 +386,82 @@ async def accept_query(
     color_palette: str | None = Form(None),
     regenerate: bool = Form(False),
     schema_type: str = Form("medspa"),
+    idempotency_key: str | None = Header(None),
 ):
     """Accept query and start background processing without blocking (prevents 504)."""
     try:
 
+        # A UUID Idempotency-Key doubles as the session id, so client retries
+        # land on the same session instead of spawning a duplicate graph run.
+        keyed = bool(idempotency_key) and _is_uuid(idempotency_key)
         if not session_id:
-            session_id = f"session_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+            if keyed:
+                session_id = idempotency_key.lower()
+            else:
+                session_id = f"session_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+
+        key = idempotency_key.lower() if keyed else None
+
+        # A retry carrying the same key is answered from the run it repeats, whether
+        # that is still starting, running, or finished and retained for polling; a
+        # new key on the same session is a new query and replaces it below
+        running = _running_requests.get(session_id)
+        if key and running and running.idempotency_key == key:
+            if running.task.done():
+                return {
+                    "session_id": session_id,
+                    "status": "completed",
+                    "message": "Query already processed. Fetch the result from /api/requests/status/{session_id}.",
+                }
+            return {
+                "session_id": session_id,
+                "status": "processing",
+                "message": "Query already in progress. Poll /api/requests/status/{session_id} for progress.",
+            }
 
         if session_id in _running_requests:
             try:
-                _running_requests[session_id].cancel()
+                _running_requests[session_id].task.cancel()
             except Exception:
                 pass
             _running_requests.pop(session_id, None)
-        doc_meta = None
-        if file is not None:
-
-            doc_meta = await save_upload_to_disk(file)
 
-        logo_meta = None
-        if logo is not None:
-            logo_meta = await save_logo_to_disk(logo, session_id)
+        # Claim the session before the first await so a concurrent retry finds this
+        # request instead of starting (or cancelling) another run
+        placeholder = asyncio.get_running_loop().create_future()
+        _running_requests[session_id] = _RunningRequest(placeholder, key)
+        try:
+            if logo is not None or image is not None:
+                # Logo/image rows reference the session, so it has to exist first
+                async with async_db_session() as db:
+                    await async_ensure_session(db, session_id, (text or "")[:50])
+
+            # The uploads are independent, so let their disk copies overlap; a failed
+            # attachment is dropped rather than failing the whole query
+            saved = await asyncio.gather(
+                save_upload_to_disk(file) if file is not None else _no_upload(),
+                save_logo_to_disk(logo, session_id) if logo is not None else _no_upload(),
+                save_image_to_disk(image, session_id) if image is not None else _no_upload(),
+                return_exceptions=True,
+            )
+        except BaseException:
+            placeholder.cancel()
+            _forget_request(session_id, placeholder)
+            raise
 
-        image_meta = None
-        if image is not None:
-            image_meta = await save_image_to_disk(image, session_id)
+        if placeholder.cancelled():
+            # A newer query or a cancel request took the session meanwhile
+            return {
+                "session_id": session_id,
+                "status": "cancelled",
+                "message": "Query was superseded before it started.",
+            }
+        for kind, meta in zip(("doc", "logo", "image"), saved):
+            if isinstance(meta, Exception):
+                logger.error(f"❌ Failed to save {kind} upload for {session_id}: {meta}")
+        doc_meta, logo_meta, image_meta = (
+            None if isinstance(meta, Exception) else meta for meta in saved
+        )
 
         task = asyncio.create_task(
             process_query_request(
@@ -153,7 +476,8 @@ async def accept_query(
                 schema_type,
             )
         )
-        _running_requests[session_id] = task
+        task.add_done_callback(functools.partial(_on_request_done, session_id))
+        _running_requests[session_id] = _RunningRequest(task, key)
 
         return {
             "session_id": session_id,
@@ -166,6 +490,57 @@ async def accept_query(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _run_graph(state: dict, thread_id: str, tags: list, metadata: dict) -> dict:
+    """Run the compiled graph on a checkpoint thread and return the final state."""
+    config = RunnableConfig(
+        configurable={"thread_id": thread_id, **_BASE_CONFIGURABLE},
+        tags=tags,
+        metadata={**_BASE_METADATA, **metadata},
+    )
+    async with _graph_sem:
+        return await compiled_graph.ainvoke(state, config=config, **_graph_run_kwargs) or state
+
+
+def _persist_run(
+    session_id: str, text: str, result: dict | None, sandbox_url: str | None
+) -> None:
+    """Store a finished run as an assistant message plus its conversation entry."""
+    dumped = json.dumps(result) if result else None
+    with db_session() as db:
+        session_obj = ensure_session(db, session_id, (text or "")[:50])
+
+        message_id = str(uuid.uuid4())
+        conv_id = str(uuid.uuid4())
+
+        msg = Message(
+            id=message_id,
+            session_id=session_id,
+            role="assistant",
+            content=(dumped[:500] if dumped else ""),
+            created_at=datetime.utcnow(),
+        )
+        db.add(msg)
+        # No relationship() links the models, so the unit of work won't order the
+        # INSERTs by FK; the message must exist before its conversation row
+        db.flush()
+
+        conv = ConversationHistory(
+            id=conv_id,
+            session_id=session_id,
+            message_id=message_id,
+            user_query=text,
+            ai_response=(dumped[:1000] if dumped else None),
+            generated_code=dumped,
+            sandbox_url=sandbox_url,
+            generation_timestamp=datetime.utcnow(),
+            is_edit=False,
+            meta={},
+        )
+        db.add(conv)
+
+        session_obj.updated_at = datetime.utcnow()
+
+
 async def process_query_request(
     session_id: str,
     text: str,
@@ -179,10 +554,14 @@ async def process_query_request(
 ):
     """Process individual query request - isolated per session"""
     try:
+        # Debounce: a newer query for this session cancels us (see accept_query), so
+        # one arriving inside the window replaces this run before any LLM work starts
+        if _QUERY_COALESCE_S:
+            await asyncio.sleep(_QUERY_COALESCE_S)
 
         payload = {
             "session_id": session_id,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": _utc_timestamp(),
             "text": text,
             "llm_model": llm_model,
             "doc": doc,
@@ -192,19 +571,16 @@ async def process_query_request(
             "regenerate": regenerate,
         }
 
-        state = user_node_init_state(payload)
+        # Loads/creates the session and stores the user message with sync ORM calls
+        state = await asyncio.to_thread(user_node_init_state, payload)
 
         state["metadata"] = {"regenerate": regenerate, "schema_type": schema_type}
         thread_id = _as_uuid(session_id)
 
-        config = RunnableConfig(
-            configurable={"thread_id": thread_id, "recursion_limit": 50},
-            tags=[
-                "api_request",
-                "frontend",
-                f"model:{llm_model or 'default'}",
-                f"session:{session_id[:8]}",
-            ],
+        result = await _run_graph(
+            state,
+            thread_id,
+            tags=[*_request_tags("frontend", llm_model), f"session:{session_id[:8]}"],
             metadata={
                 "session_id": session_id,
                 "thread_id": thread_id,
@@ -213,22 +589,10 @@ async def process_query_request(
                 "has_logo": bool(logo_data),
                 "text_preview": text[:100] if text else "",
                 "run_name": f"query_{session_id[:8]}_{int(time.time())}",
-                "project_name": os.getenv("LANGCHAIN_PROJECT", "lovable-orchestrator"),
             },
         )
 
-        final_result = None
-
-        async for chunk in compiled_graph.astream(state, config=config):
-            final_result = chunk
-
-        result = final_result[list(final_result.keys())[-1]] if final_result else state
-
         try:
-            from db import db_session
-            from models import Session, Message, ConversationHistory
-            import uuid
-
             sandbox_url = None
             try:
                 sandbox_url = result.get("sandbox_url") or result.get(
@@ -237,46 +601,12 @@ async def process_query_request(
             except Exception:
                 sandbox_url = None
 
-            with db_session() as db:
-                session_obj = db.get(Session, session_id)
-                if not session_obj:
-                    session_obj = Session(
-                        id=session_id, title=(text or "")[:50], meta={}
-                    )
-                    db.add(session_obj)
-
-                message_id = str(uuid.uuid4())
-                conv_id = str(uuid.uuid4())
-
-                msg = Message(
-                    id=message_id,
-                    session_id=session_id,
-                    role="assistant",
-                    content=(json.dumps(result)[:500] if result else ""),
-                    created_at=datetime.utcnow(),
-                )
-                db.add(msg)
-
-                conv = ConversationHistory(
-                    id=conv_id,
-                    session_id=session_id,
-                    message_id=message_id,
-                    user_query=text,
-                    ai_response=(json.dumps(result)[:1000] if result else None),
-                    generated_code=json.dumps(result) if result else None,
-                    sandbox_url=sandbox_url,
-                    generation_timestamp=datetime.utcnow(),
-                    is_edit=False,
-                    meta={},
-                )
-                db.add(conv)
-
-                session_obj.updated_at = datetime.utcnow()
-
-                db.commit()
+            # Serialising the final state and the sync ORM commit both block; run
+            # them on a worker thread
+            await asyncio.to_thread(_persist_run, session_id, text, result, sandbox_url)
 
         except Exception as persist_err:
-            print(
+            logger.warning(
                 f"⚠️ Persist error (non-fatal) for session {session_id}: {persist_err}"
             )
 
@@ -286,9 +616,7 @@ async def process_query_request(
         raise
     except Exception as e:
 
-        import traceback
-
-        traceback.print_exc()
+        logger.exception(f"❌ Query processing failed for session {session_id}")
         raise HTTPException(
             status_code=500, detail=f"Request processing failed: {str(e)}"
         )
@@ -304,43 +632,33 @@ async def regenerate_query(
 
         payload = {
             "session_id": session_id,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": _utc_timestamp(),
             "text": "...",
             "llm_model": llm_model,
             "regenerate": True,
         }
 
-        state = user_node_init_state(payload)
+        state = await asyncio.to_thread(user_node_init_state, payload)
 
         state["metadata"] = {"regenerate": True, "schema_type": schema_type}
 
         thread_id = _as_uuid(session_id)
 
-        config = RunnableConfig(
-            configurable={"thread_id": thread_id, "recursion_limit": 50},
-            tags=["api_request", "regenerate", f"model:{llm_model or 'default'}"],
+        result = await _run_graph(
+            state,
+            thread_id,
+            tags=list(_request_tags("regenerate", llm_model)),
             metadata={
                 "session_id": thread_id,
                 "model": llm_model,
                 "run_name": f"regenerate_{thread_id[:8]}",
-                "project_name": os.getenv("LANGCHAIN_PROJECT", "lovable-orchestrator"),
             },
         )
 
-        final_result = None
-
-        async for chunk in compiled_graph.astream(state, config=config):
-            final_result = chunk
-
-        # Use the final result
-        result = final_result[list(final_result.keys())[-1]] if final_result else state
-
         return {"session_id": result["session_id"], "accepted": True, "state": result}
     except Exception as e:
 
-        import traceback
-
-        traceback.print_exc()
+        logger.exception("❌ Regenerate failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -368,32 +686,12 @@ async def get_thread_info(thread_id: str):
         return {"error": str(e), "message": "Could not fetch thread info"}
 
 
-add_routes(
-    app,
-    compiled_graph.with_config(
-        configurable={
-            "recursion_limit": 50,
-        },
-        tags=["langserve", "studio"],
-        metadata={"source": "langserve_playground"},
-    ),
-    path="/graph",
-)
-
-
-@app.post("/api/cleanup")
-async def cleanup_session():
-    """Emergency cleanup endpoint - kills all running sandboxes immediately"""
-    try:
-
-        from nodes.apply_to_Sandbox_node import cleanup_all_sessions
-
-        cleanup_all_sessions()
-
-        return {"success": True, "message": "All sandboxes terminated"}
-    except Exception as e:
-
-        return {"success": False, "error": str(e)}
+@app.post("/api/cleanup", status_code=202)
+async def cleanup_session(background_tasks: BackgroundTasks):
+    """Emergency cleanup endpoint - kills all running sandboxes in the background"""
+    # Sandbox kill() calls are blocking HTTP; Starlette runs sync tasks in its threadpool
+    background_tasks.add_task(cleanup_all_sessions)
+    return {"success": True, "accepted": True, "message": "Sandbox termination started"}
 
 
 @app.get("/")
@@ -401,44 +699,66 @@ def health():
     return {"ok": True, "service": "lovable-orchestrator"}
 
 
+# Tracing settings are fixed once the module has loaded; snapshot them for the debug probes
+_TRACING_ENV = {
+    "LANGCHAIN_TRACING_V2": os.getenv("LANGCHAIN_TRACING_V2"),
+    "LANGCHAIN_PROJECT": os.getenv("LANGCHAIN_PROJECT"),
+    "LANGCHAIN_API_KEY": "***" if os.getenv("LANGCHAIN_API_KEY") else None,
+    "LANGCHAIN_ENDPOINT": os.getenv(
+        "LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com"
+    ),
+}
+
+_GRAPH_INFO = {
+    "graph_nodes": list(graph.nodes.keys()),
+    "graph_edges": sorted(graph.edges),
+    "langserve_url": "/graph/playground",
+    "api_endpoint": "/api/query",
+    "langsmith_enabled": _TRACING_ENV["LANGCHAIN_TRACING_V2"] == "true",
+    "langsmith_project": _PROJECT,
+}
+
+
 @app.get("/debug/graph")
 def debug_graph():
-    return {
-        "graph_nodes": list(graph.nodes.keys()),
-        "graph_edges": list(graph.edges),
-        "langserve_url": "/graph/playground",
-        "api_endpoint": "/api/query",
-        "langsmith_enabled": os.getenv("LANGCHAIN_TRACING_V2") == "true",
-        "langsmith_project": os.getenv("LANGCHAIN_PROJECT", "default"),
-    }
+    return _GRAPH_INFO
 
 
 @app.get("/debug/tracing")
 def debug_tracing():
     """Debug endpoint to check tracing configuration"""
-    return {
-        "LANGCHAIN_TRACING_V2": os.getenv("LANGCHAIN_TRACING_V2"),
-        "LANGCHAIN_PROJECT": os.getenv("LANGCHAIN_PROJECT"),
-        "LANGCHAIN_API_KEY": "***" if os.getenv("LANGCHAIN_API_KEY") else None,
-        "LANGCHAIN_ENDPOINT": os.getenv(
-            "LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com"
-        ),
-    }
+    return _TRACING_ENV
+
+
+@app.get("/debug/checkpointer")
+async def debug_checkpointer():
+    """Debug endpoint to inspect the LangGraph checkpoint database"""
+    try:
+        return await asyncio.to_thread(checkpoint_db_info)
+    except Exception as e:
+        return {"error": str(e), "message": "Could not read checkpoint database"}
+
+
+_langsmith_client: Client | None = None
+
+
+def _get_langsmith_client() -> Client:
+    """Shared LangSmith client so debug calls reuse one HTTP connection pool."""
+    global _langsmith_client
+    if _langsmith_client is None:
+        _langsmith_client = Client()
+    return _langsmith_client
 
 
 @app.get("/debug/threads")
 async def debug_threads():
     """Debug endpoint to list active threads"""
     try:
-        from langsmith import Client
+        client = _get_langsmith_client()
 
-        client = Client()
-
-        runs = list(
-            client.list_runs(
-                project_name=os.getenv("LANGCHAIN_PROJECT", "lovable-orchestrator"),
-                limit=10,
-            )
+        # list_runs pages over the client's sync HTTP session; keep it off the loop
+        runs = await asyncio.to_thread(
+            lambda: list(client.list_runs(project_name=_PROJECT, limit=10))
         )
 
         thread_info = []
@@ -464,7 +784,7 @@ async def debug_threads():
         return {
             "active_threads": thread_info,
             "total_runs": len(runs),
-            "project": os.getenv("LANGCHAIN_PROJECT", "lovable-orchestrator"),
+            "project": _PROJECT,
         }
     except Exception as e:
         return {"error": str(e), "message": "Could not fetch thread info"}
@@ -475,7 +795,7 @@ async def get_requests_status():
     """Get status of all running requests"""
     try:
         status = {}
-        for session_id, task in _running_requests.items():
+        for session_id, (task, _key) in _running_requests.items():
             status[session_id] = {
                 "status": "running" if not task.done() else "completed",
                 "cancelled": task.cancelled(),
@@ -493,7 +813,8 @@ async def get_requests_status():
 async def get_request_status(session_id: str):
     """Return running/completed/failed status for a specific session, with result if done."""
     try:
-        task = _running_requests.get(session_id)
+        entry = _running_requests.get(session_id)
+        task = entry.task if entry else None
 
         if task and not task.done():
             return {"session_id": session_id, "status": "running"}
@@ -510,23 +831,22 @@ async def get_request_status(session_id: str):
                 return {"session_id": session_id, "status": "failed", "error": str(e)}
 
         try:
-            from db import db_session
-            from models import ConversationHistory
-
-            with db_session() as db:
+            async with async_db_session() as db:
                 conv = (
-                    db.query(ConversationHistory)
-                    .filter(ConversationHistory.session_id == session_id)
-                    .order_by(ConversationHistory.generation_timestamp.desc())
-                    .first()
-                )
+                    await db.execute(
+                        select(ConversationHistory.generated_code)
+                        .where(ConversationHistory.session_id == session_id)
+                        .order_by(desc(ConversationHistory.generation_timestamp))
+                        .limit(1)
+                    )
+                ).first()
                 if conv:
 
                     return {
                         "session_id": session_id,
                         "status": "completed",
                         "result": (
-                            json.loads(conv.generated_code)
+                            orjson.loads(conv.generated_code)
                             if conv.generated_code
                             else None
                         ),
@@ -548,7 +868,7 @@ async def cancel_request(session_id: str):
     try:
         if session_id in _running_requests:
 
-            _running_requests[session_id].cancel()
+            _running_requests[session_id].task.cancel()
             _running_requests.pop(session_id, None)
             return {
                 "success": True,
@@ -568,7 +888,7 @@ async def cancel_all_requests():
     """Cancel all running requests"""
     try:
         cancelled_count = 0
-        for session_id, task in _running_requests.items():
+        for session_id, (task, _key) in _running_requests.items():
 
             task.cancel()
             cancelled_count += 1
@@ -580,139 +900,184 @@ async def cancel_all_requests():
         return {"error": str(e)}
 
 
-@app.get("/api/sessions")
-async def get_sessions():
-    """Get all sessions with their conversation history"""
+def _encode_session_cursor(updated_at: datetime, session_id: str) -> str:
+    return f"{updated_at.isoformat()}|{session_id}"
+
+
+def _decode_session_cursor(cursor: str) -> tuple:
+    ts, sep, session_id = cursor.partition("|")
     try:
-        from db import db_session
-        from models import Session, ConversationHistory, Message
-        from sqlalchemy import select, func, desc
-
-        with db_session() as db:
-
-            stmt = (
-                select(
-                    Session.id,
-                    Session.created_at,
-                    Session.updated_at,
-                    Session.title,
-                    Session.meta,
-                    func.count(Message.id).label("message_count"),
-                    func.max(ConversationHistory.generation_timestamp).label(
-                        "last_activity"
-                    ),
-                )
-                .outerjoin(Message, Session.id == Message.session_id)
-                .outerjoin(
-                    ConversationHistory, Session.id == ConversationHistory.session_id
-                )
-                .group_by(Session.id)
-                .order_by(desc(Session.updated_at))
+        if not sep or not session_id:
+            raise ValueError(cursor)
+        return datetime.fromisoformat(ts), session_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/api/sessions", response_model=SessionListOut)
+async def get_sessions(
+    limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None
+):
+    """Get a page of sessions, newest first; pass next_cursor back for the next page.
+
+    Returns at most `limit` sessions (50 unless given, up to 200); next_cursor is
+    null on the last page.
+    """
+    after = _decode_session_cursor(cursor) if cursor else None
+    try:
+        async with async_db_session() as db:
+
+            # Correlated per-session aggregates; joining both child tables and grouping
+            # would multiply messages by conversations before counting
+            message_count = (
+                select(func.count(Message.id))
+                .where(Message.session_id == Session.id)
+                .scalar_subquery()
+            )
+            last_activity = (
+                select(func.max(ConversationHistory.generation_timestamp))
+                .where(ConversationHistory.session_id == Session.id)
+                .scalar_subquery()
             )
+            stmt = select(
+                Session.id,
+                Session.created_at,
+                Session.updated_at,
+                Session.title,
+                Session.meta,
+                message_count.label("message_count"),
+                last_activity.label("last_activity"),
+            ).order_by(desc(Session.updated_at), desc(Session.id))
+            if after:
+                # Keyset on (updated_at, id): rows strictly after the previous page's last one
+                after_ts, after_id = after
+                stmt = stmt.where(
+                    or_(
+                        Session.updated_at < after_ts,
+                        and_(Session.updated_at == after_ts, Session.id < after_id),
+                    )
+                )
+            rows = (await db.execute(stmt.limit(limit + 1))).all()
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = _encode_session_cursor(rows[-1].updated_at, rows[-1].id)
 
             sessions = []
-            for row in db.execute(stmt):
+            for row in rows:
                 sessions.append(
                     {
                         "id": row.id,
                         "title": row.title or f"Session {row.id[:8]}",
-                        "created_at": row.created_at.isoformat(),
-                        "updated_at": row.updated_at.isoformat(),
+                        "created_at": row.created_at,
+                        "updated_at": row.updated_at,
                         "message_count": row.message_count or 0,
-                        "last_activity": (
-                            row.last_activity.isoformat() if row.last_activity else None
-                        ),
+                        "last_activity": row.last_activity,
                         "meta": row.meta or {},
                     }
                 )
 
-            return {"sessions": sessions}
+            # The response model serializes straight to JSON, datetimes included
+            return {"sessions": sessions, "next_cursor": next_cursor}
     except Exception as e:
 
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/sessions/{session_id}")
+async def _fetch_all(stmt) -> list:
+    """Run one SELECT on its own async session so independent queries can overlap."""
+    async with async_db_session() as db:
+        return (await db.execute(stmt)).scalars().all()
+
+
+async def _fetch_one(model, ident):
+    async with async_db_session() as db:
+        return await db.get(model, ident)
+
+
+@app.get("/api/sessions/{session_id}", response_model=SessionDetailsOut)
 async def get_session_details(session_id: str):
     """Get detailed session information including conversation history and generated links"""
     try:
-        from db import db_session
-        from models import Session, Message, ConversationHistory, SessionGeneratedLinks
-        from sqlalchemy import select, desc
-
-        with db_session() as db:
+        messages_stmt = (
+            select(Message)
+            .where(Message.session_id == session_id)
+            .order_by(Message.created_at)
+        )
+        conv_stmt = (
+            select(ConversationHistory)
+            .where(ConversationHistory.session_id == session_id)
+            .order_by(ConversationHistory.generation_timestamp)
+        )
+        links_stmt = (
+            select(SessionGeneratedLinks)
+            .where(SessionGeneratedLinks.session_id == session_id)
+            .order_by(desc(SessionGeneratedLinks.created_at))
+        )
 
-            session = db.get(Session, session_id)
-            if not session:
-                raise HTTPException(status_code=404, detail="Session not found")
+        # An AsyncSession runs one statement at a time, so each query gets its own
+        session, message_rows, conv_rows, link_rows = await asyncio.gather(
+            _fetch_one(Session, session_id),
+            _fetch_all(messages_stmt),
+            _fetch_all(conv_stmt),
+            _fetch_all(links_stmt),
+        )
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        messages = [
+            {
+                "id": m.id,
+                "role": m.role,
+                "content": m.content,
+                "created_at": m.created_at,
+                "meta": m.meta,
+            }
+            for m in message_rows
+        ]
 
-            messages_stmt = (
-                select(Message)
-                .where(Message.session_id == session_id)
-                .order_by(Message.created_at)
-            )
-            messages = [
+        conversations = []
+        for conv in conv_rows:
+            conversations.append(
                 {
-                    "id": m.id,
-                    "role": m.role,
-                    "content": m.content,
-                    "created_at": m.created_at.isoformat(),
-                    "meta": m.meta,
+                    "id": conv.id,
+                    "user_query": conv.user_query,
+                    "ai_response": conv.ai_response,
+                    "generated_code": conv.generated_code,
+                    "sandbox_url": conv.sandbox_url,
+                    "generation_timestamp": conv.generation_timestamp,
+                    "is_edit": conv.is_edit,
+                    "meta": conv.meta,
                 }
-                for m in db.execute(messages_stmt).scalars()
-            ]
-
-            conv_stmt = (
-                select(ConversationHistory)
-                .where(ConversationHistory.session_id == session_id)
-                .order_by(ConversationHistory.generation_timestamp)
             )
-            conversations = []
-            for conv in db.execute(conv_stmt).scalars():
-                conversations.append(
-                    {
-                        "id": conv.id,
-                        "user_query": conv.user_query,
-                        "ai_response": conv.ai_response,
-                        "generated_code": conv.generated_code,
-                        "sandbox_url": conv.sandbox_url,
-                        "generation_timestamp": conv.generation_timestamp.isoformat(),
-                        "is_edit": conv.is_edit,
-                        "meta": conv.meta,
-                    }
-                )
 
-            links_stmt = (
-                select(SessionGeneratedLinks)
-                .where(SessionGeneratedLinks.session_id == session_id)
-                .order_by(desc(SessionGeneratedLinks.created_at))
+        generated_links = []
+        for link in link_rows:
+            generated_links.append(
+                {
+                    "id": link.id,
+                    "sandbox_url": link.sandbox_url,
+                    "generated_code": link.generated_code,
+                    "generation_number": link.generation_number,
+                    "created_at": link.created_at,
+                    "is_active": link.is_active,
+                    "meta": link.meta,
+                }
             )
-            generated_links = []
-            for link in db.execute(links_stmt).scalars():
-                generated_links.append(
-                    {
-                        "id": link.id,
-                        "sandbox_url": link.sandbox_url,
-                        "generated_code": link.generated_code,
-                        "generation_number": link.generation_number,
-                        "created_at": link.created_at.isoformat(),
-                        "is_active": link.is_active,
-                        "meta": link.meta,
-                    }
-                )
 
-            return {
-                "session": {
-                    "id": session.id,
-                    "title": session.title or f"Session {session.id[:8]}",
-                    "created_at": session.created_at.isoformat(),
-                    "updated_at": session.updated_at.isoformat(),
-                    "meta": session.meta or {},
-                },
-                "messages": messages,
-                "conversations": conversations,
-                "generated_links": generated_links,
-            }
+        return {
+            "session": {
+                "id": session.id,
+                "title": session.title or f"Session {session.id[:8]}",
+                "created_at": session.created_at,
+                "updated_at": session.updated_at,
+                "meta": session.meta or {},
+            },
+            "messages": messages,
+            "conversations": conversations,
+            "generated_links": generated_links,
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -729,7 +1094,7 @@ async def restore_session_code(
 
         payload = {
             "session_id": session_id,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": _utc_timestamp(),
             "text": text,
             "llm_model": None,
             "doc": None,
@@ -737,187 +1102,159 @@ async def restore_session_code(
             "regenerate": False,
         }
 
-        state = user_node_init_state(payload)
+        state = await asyncio.to_thread(user_node_init_state, payload)
 
         state["context"] = {"restore_link_id": link_id}
 
         thread_id = _as_uuid(state.get("session_id"))
 
-        config = RunnableConfig(
-            configurable={"thread_id": thread_id, "recursion_limit": 50},
-            tags=["api_request", "restore", "frontend"],
+        result = await _run_graph(
+            state,
+            thread_id,
+            tags=list(_RESTORE_TAGS),
             metadata={
                 "session_id": thread_id,
                 "restore_link_id": link_id,
                 "run_name": f"restore_{thread_id[:8]}",
-                "project_name": os.getenv("LANGCHAIN_PROJECT", "lovable-orchestrator"),
             },
         )
 
-        final_result = None
-
-        async for chunk in compiled_graph.astream(state, config=config):
-            final_result = chunk
-
-        # Use the final result
-        result = final_result[list(final_result.keys())[-1]] if final_result else state
-
         return {"session_id": result["session_id"], "accepted": True, "state": result}
     except Exception as e:
 
-        import traceback
-
-        traceback.print_exc()
+        logger.exception("❌ Restore failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/sessions/{session_id}/conversations/{conversation_id}/restore")
 async def restore_conversation_design(session_id: str, conversation_id: str):
     """Restore a specific conversation's design to a new sandbox"""
-    from db import db_session
-    from models import ConversationHistory
-    from nodes.apply_to_Sandbox_node import apply_sandbox
-
-    with db_session() as db:
-
+    # Only the stored result is needed, and the DB session is released before the
+    # (slow) sandbox build rather than held across it
+    async with async_db_session() as db:
         conversation = (
-            db.query(ConversationHistory)
-            .filter(
-                ConversationHistory.id == conversation_id,
-                ConversationHistory.session_id == session_id,
+            await db.execute(
+                select(ConversationHistory.generated_code).where(
+                    ConversationHistory.id == conversation_id,
+                    ConversationHistory.session_id == session_id,
+                )
             )
-            .first()
-        )
+        ).first()
 
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
 
-        if not conversation.generated_code:
-            raise HTTPException(
-                status_code=400, detail="No generated code found for this conversation"
-            )
-
-        try:
+    if not conversation.generated_code:
+        raise HTTPException(
+            status_code=400, detail="No generated code found for this conversation"
+        )
 
-            generation_result = json.loads(conversation.generated_code)
+    try:
+        generation_result = orjson.loads(conversation.generated_code)
 
-            if generation_result.get("e2b_script") and not generation_result.get(
-                "files_to_correct"
-            ):
+        if generation_result.get("e2b_script") and not generation_result.get(
+            "files_to_correct"
+        ):
 
-                if generation_result.get("is_edit"):
-                    generation_result["is_edit"] = False
-                if generation_result.get("is_correction"):
-                    generation_result["is_correction"] = False
-            else:
+            if generation_result.get("is_edit"):
+                generation_result["is_edit"] = False
+            if generation_result.get("is_correction"):
+                generation_result["is_correction"] = False
+        else:
 
-                files_to_correct = generation_result.get("files_to_correct", [])
-                new_files = generation_result.get("new_files", [])
-
-                script_lines = []
-                script_lines.append("def create_react_app(sandbox):")
-                script_lines.append('    """Restore design from stored corrections"""')
-                script_lines.append("    print('Restoring stored design...')")
-
-                for file_correction in files_to_correct:
-                    file_path = file_correction.get("path", "")
-                    corrected_content = file_correction.get("corrected_content", "")
-                    if file_path and corrected_content:
-
-                        escaped_content = (
-                            corrected_content.replace("\\", "\\\\")
-                            .replace('"', '\\"')
-                            .replace("\n", "\\n")
-                        )
-                        script_lines.append(f"    # Restore {file_path}")
-                        script_lines.append(
-                            f'    {file_path.replace("/", "_").replace(".", "_")}_content = """{escaped_content}"""'
-                        )
-                        script_lines.append(
-                            f'    sandbox.files.write("my-app/{file_path}", {file_path.replace("/", "_").replace(".", "_")}_content)'
-                        )
-                        script_lines.append(f'    print(f"✅ Restored {file_path}")')
-
-                for file_info in new_files:
-                    file_path = file_info.get("path", "")
-                    content = file_info.get("content", "")
-                    if file_path and content:
-                        escaped_content = (
-                            content.replace("\\", "\\\\")
-                            .replace('"', '\\"')
-                            .replace("\n", "\\n")
-                        )
-                        script_lines.append(f"    # Create new file {file_path}")
-                        script_lines.append(
-                            f'    {file_path.replace("/", "_").replace(".", "_")}_content = """{escaped_content}"""'
-                        )
-                        script_lines.append(
-                            f'    sandbox.files.write("my-app/{file_path}", {file_path.replace("/", "_").replace(".", "_")}_content)'
-                        )
-                        script_lines.append(f'    print(f"✅ Created {file_path}")')
-
-                script_lines.append("    print('✅ Design restored successfully')")
-                script_lines.append(
-                    "    return 'Design restored from stored corrections'"
-                )
+            files_to_correct = generation_result.get("files_to_correct", [])
+            new_files = generation_result.get("new_files", [])
+
+            script_lines = []
+            script_lines.append("def create_react_app(sandbox):")
+            script_lines.append('    """Restore design from stored corrections"""')
+            script_lines.append("    print('Restoring stored design...')")
+
+            for file_correction in files_to_correct:
+                file_path = file_correction.get("path", "")
+                corrected_content = file_correction.get("corrected_content", "")
+                if file_path and corrected_content:
+                    # A JSON string (ensure_ascii=False) is also a valid Python literal
+                    literal = json.dumps(corrected_content, ensure_ascii=False)
+                    script_lines.append(f"    # Restore {file_path}")
+                    script_lines.append(
+                        f"    sandbox.files.write({json.dumps('my-app/' + file_path)}, {literal})"
+                    )
+                    script_lines.append(f'    print(f"✅ Restored {file_path}")')
+
+            for file_info in new_files:
+                file_path = file_info.get("path", "")
+                content = file_info.get("content", "")
+                if file_path and content:
+                    literal = json.dumps(content, ensure_ascii=False)
+                    script_lines.append(f"    # Create new file {file_path}")
+                    script_lines.append(
+                        f"    sandbox.files.write({json.dumps('my-app/' + file_path)}, {literal})"
+                    )
+                    script_lines.append(f'    print(f"✅ Created {file_path}")')
 
-                full_script = "\n".join(script_lines)
+            script_lines.append("    print('✅ Design restored successfully')")
+            script_lines.append(
+                "    return 'Design restored from stored corrections'"
+            )
 
-                generation_result = {
-                    "e2b_script": full_script,
-                    "is_correction": False,
-                    "is_edit": False,
-                }
+            full_script = "\n".join(script_lines)
 
-            state = {
-                "session_id": session_id,
-                "context": {"generation_result": generation_result},
+            generation_result = {
+                "e2b_script": full_script,
+                "is_correction": False,
+                "is_edit": False,
             }
 
-            sandbox_result = await apply_sandbox(state)
+        state = {
+            "session_id": session_id,
+            "context": {"generation_result": generation_result},
+        }
 
-            if sandbox_result and sandbox_result.get("context", {}).get(
-                "sandbox_result", {}
-            ).get("url"):
+        sandbox_result = await apply_sandbox(state)
 
-                url = sandbox_result["context"]["sandbox_result"]["url"]
+        if sandbox_result and sandbox_result.get("context", {}).get(
+            "sandbox_result", {}
+        ).get("url"):
 
-                generation_id = conversation_id[:8]
-                unique_url = f"{url}?gen_id={generation_id}&restored=true"
+            url = sandbox_result["context"]["sandbox_result"]["url"]
 
-                return {
-                    "success": True,
-                    "sandbox_url": unique_url,
-                    "conversation_id": conversation_id,
-                    "generation_id": generation_id,
-                }
-            else:
-                raise HTTPException(status_code=500, detail="Failed to create sandbox")
+            generation_id = conversation_id[:8]
+            unique_url = f"{url}?gen_id={generation_id}&restored=true"
 
-        except Exception as e:
+            return {
+                "success": True,
+                "sandbox_url": unique_url,
+                "conversation_id": conversation_id,
+                "generation_id": generation_id,
+            }
+        else:
+            raise HTTPException(status_code=500, detail="Failed to create sandbox")
 
-            raise HTTPException(
-                status_code=500, detail=f"Failed to restore design: {str(e)}"
-            )
+    except Exception as e:
+
+        raise HTTPException(
+            status_code=500, detail=f"Failed to restore design: {str(e)}"
+        )
 
 
 @app.put("/api/sessions/{session_id}/title")
-async def update_session_title(session_id: str, title: str = Form(...)):
+async def update_session_title(
+    session_id: str, title: str = Form(...), db: AsyncSession = Depends(get_async_db)
+):
     """Update session title"""
     try:
-        from db import db_session
-        from models import Session
-
-        with db_session() as db:
-            session = db.get(Session, session_id)
-            if not session:
-                raise HTTPException(status_code=404, detail="Session not found")
+        updated = await db.execute(
+            update(Session)
+            .where(Session.id == session_id)
+            .values(title=title, updated_at=datetime.utcnow())
+        )
+        if not updated.rowcount:
+            raise HTTPException(status_code=404, detail="Session not found")
 
-            session.title = title
-            session.updated_at = datetime.utcnow()
-            db.commit()
+        await db.commit()
 
-            return {"success": True, "title": title}
+        return {"success": True, "title": title}
     except HTTPException:
         raise
     except Exception as e:
@@ -926,33 +1263,226 @@ async def update_session_title(session_id: str, title: str = Form(...)):
 
 
 @app.delete("/api/sessions/{session_id}")
-async def delete_session(session_id: str):
+async def delete_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Delete a session and all its associated data"""
     try:
-        from db import db_session
-        from models import Session, ConversationHistory, SessionGeneratedLinks
+        # Messages, conversations, links, logos and images go with it via ON DELETE
+        # CASCADE once the schema is migrated; before that, clear them child-first
+        if not _cascade_deletes:
+            for model in (
+                SessionGeneratedLinks,
+                ConversationHistory,
+                Message,
+                Logo,
+                Image,
+            ):
+                await db.execute(delete(model).where(model.session_id == session_id))
+        deleted = await db.execute(delete(Session).where(Session.id == session_id))
+        await db.commit()
 
-        with db_session() as db:
+        if deleted.rowcount:
+            return {"message": "Session deleted successfully"}
+        else:
+            return {"error": "Session not found"}, 404
 
-            db.query(ConversationHistory).filter(
-                ConversationHistory.session_id == session_id
-            ).delete()
+    except Exception as e:
 
-            db.query(SessionGeneratedLinks).filter(
-                SessionGeneratedLinks.session_id == session_id
-            ).delete()
+        return {"error": "Failed to delete session"}, 500
 
-            session = db.query(Session).filter(Session.id == session_id).first()
-            if session:
-                db.delete(session)
-                db.commit()
-                return {"message": "Session deleted successfully"}
-            else:
-                return {"error": "Session not found"}, 404
 
+# Upper bound on in-flight E2B list/read calls while walking a sandbox
+SANDBOX_SCAN_CONCURRENCY = 32
+
+# Keep stray build output and media out of project downloads so memory stays bounded
+MAX_DOWNLOAD_FILE_BYTES = 10 * 1024 * 1024
+_SKIP_DOWNLOAD_EXTENSIONS = {".map", ".mp4", ".mov", ".webm", ".zip", ".log"}
+
+
+async def _scan_sandbox_files(
+    sandbox, root: str, listing_cache: Dict[str, list] | None = None
+) -> Dict[str, str]:
+    """Walk a sandbox directory concurrently and read every non-empty file.
+
+    Pass the same listing_cache to repeated scans within one request so each
+    directory is listed at most once.
+    """
+    files: Dict[str, str] = {}
+    sem = asyncio.Semaphore(SANDBOX_SCAN_CONCURRENCY)
+    if listing_cache is None:
+        listing_cache = {}
+
+    async def list_dir(directory_path: str):
+        if directory_path not in listing_cache:
+            async with sem:
+                listing_cache[directory_path] = await _async_sandbox_file_list(
+                    sandbox, directory_path
+                )
+        return listing_cache[directory_path]
+
+    async def read_file(item, item_path: str):
+        if os.path.splitext(item_path)[1].lower() in _SKIP_DOWNLOAD_EXTENSIONS:
+            return
+        size = getattr(item, "size", None)
+        if size and size > MAX_DOWNLOAD_FILE_BYTES:
+            logger.warning(f"⚠️ Skipping oversized file {item_path} ({size} bytes)")
+            return
+
+        try:
+            async with sem:
+                content = await _async_sandbox_file_read(sandbox, item_path)
+        except Exception:
+            return
+        if len(content or "") > MAX_DOWNLOAD_FILE_BYTES:
+            logger.warning(f"⚠️ Skipping oversized file {item_path}")
+            return
+        # isspace() scans in place instead of allocating a stripped copy
+        if content and not content.isspace():
+            files[item_path.replace("my-app/", "")] = content
+
+    async def visit(item, item_path: str):
+        # E2B entries carry their type ("file"/"dir"); only probe with a
+        # listing when the SDK didn't report one.
+        kind = getattr(item, "type", None)
+        kind = getattr(kind, "value", kind)
+        if kind == "dir":
+            await scan_dir(item_path)
+            return
+        if kind == "file":
+            await read_file(item, item_path)
+            return
+
+        try:
+            await list_dir(item_path)
+        except Exception:
+            await read_file(item, item_path)
+            return
+        await scan_dir(item_path)
+
+    async def scan_dir(directory_path: str):
+        try:
+            items = await list_dir(directory_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not scan directory {directory_path}: {e}")
+            return
+
+        await asyncio.gather(
+            *[
+                visit(
+                    item,
+                    f"{directory_path}/{item.name}" if directory_path else item.name,
+                )
+                for item in items
+                if item.name != "node_modules"
+            ]
+        )
+
+    await scan_dir(root)
+    return files
+
+
+class _ZipChunkSink(io.RawIOBase):
+    """Write-only, non-seekable sink that hands zip output back in chunks."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> list[bytes]:
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+# Already-compressed formats gain nothing from deflate; store them as-is
+_STORED_EXTENSIONS = {
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".ico",
+    ".webp",
+    ".woff",
+    ".woff2",
+    ".ttf",
+    ".zip",
+    ".gz",
+}
+
+
+def _iter_zip(files: Dict[str, str]):
+    """Yield a zip archive of files as it is built, one entry at a time."""
+    sink = _ZipChunkSink()
+    with zipfile.ZipFile(
+        sink, "w", zipfile.ZIP_DEFLATED, allowZip64=True, compresslevel=1
+    ) as zip_file:
+        for file_path, content in files.items():
+            if os.path.splitext(file_path)[1].lower() in _STORED_EXTENSIONS:
+                zip_file.writestr(file_path, content, compress_type=zipfile.ZIP_STORED)
+            else:
+                zip_file.writestr(file_path, content)
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+# Runs inside the sandbox (argv: root, out, max bytes, skip exts, stored exts) and
+# applies the same filters as _scan_sandbox_files/_iter_zip; exit 3 = no files
+_REMOTE_ZIP_SCRIPT = """
+import os, sys, zipfile
+root, out, limit = sys.argv[1], sys.argv[2], int(sys.argv[3])
+skip, stored = set(sys.argv[4].split(",")), set(sys.argv[5].split(","))
+n = 0
+with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+    for d, dirs, names in os.walk(root):
+        dirs[:] = [x for x in dirs if x != "node_modules"]
+        for name in names:
+            p = os.path.join(d, name)
+            ext = os.path.splitext(name)[1].lower()
+            if ext in skip or not os.path.isfile(p) or not 0 < os.path.getsize(p) <= limit:
+                continue
+            z.write(p, os.path.relpath(p, root), zipfile.ZIP_STORED if ext in stored else None)
+            n += 1
+if not n:
+    os.remove(out)
+    sys.exit(3)
+"""
+
+
+async def _remote_zip(sandbox, root: str) -> str | None:
+    """Zip root inside the sandbox; returns the archive's sandbox path, or None."""
+    out = f"/tmp/download_{uuid.uuid4().hex}.zip"
+    args = (
+        root,
+        out,
+        str(MAX_DOWNLOAD_FILE_BYTES),
+        ",".join(sorted(_SKIP_DOWNLOAD_EXTENSIONS)),
+        ",".join(sorted(_STORED_EXTENSIONS)),
+    )
+    command = " ".join(
+        ["python3", "-c", shlex.quote(_REMOTE_ZIP_SCRIPT), *map(shlex.quote, args)]
+    )
+    try:
+        result = await _async_sandbox_command(sandbox, command, 120)
     except Exception as e:
+        # Non-zero exits raise in the E2B SDK (no python3, empty project, ...)
+        logger.info(f"ℹ️ In-sandbox zip unavailable, scanning files instead: {e}")
+        return None
+    return out if result.exit_code == 0 else None
 
-        return {"error": "Failed to delete session"}, 500
+
+def _iter_sandbox_file(sandbox, path: str):
+    """Stream a sandbox file back chunk by chunk, then delete it."""
+    try:
+        yield from sandbox.files.read(path, format="stream")
+    finally:
+        try:
+            sandbox.commands.run(f"rm -f {shlex.quote(path)}", timeout=10)
+        except Exception:
+            pass
 
 
 @app.get("/api/sessions/{session_id}/conversations/{conversation_id}/download")
@@ -960,8 +1490,6 @@ async def download_conversation_files(session_id: str, conversation_id: str):
     """Download all project files as a zip archive - EXCEPT NODE_MODULES"""
     try:
 
-        from nodes.apply_to_Sandbox_node import _get_session_sandbox
-
         sandbox = _get_session_sandbox(session_id)
 
         if not sandbox:
@@ -969,133 +1497,179 @@ async def download_conversation_files(session_id: str, conversation_id: str):
                 status_code=404, detail="No active sandbox found for this session"
             )
 
-        files_to_download = {}
-
-        def scan_directory_recursive(directory_path=""):
-            """Recursively scan directory using E2B SDK"""
-            try:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"project_{conversation_id[:8]}_{timestamp}.zip"
+        headers = {"Content-Disposition": f"attachment; filename={filename}"}
+
+        # One command plus one streamed read when the sandbox can zip for us
+        remote_zip = await _remote_zip(sandbox, "my-app")
+        if remote_zip:
+            return StreamingResponse(
+                _iter_sandbox_file(sandbox, remote_zip),
+                media_type="application/zip",
+                headers=headers,
+            )
 
-                items = sandbox.files.list(directory_path)
+        listing_cache: Dict[str, list] = {}
+        files_to_download = await _scan_sandbox_files(sandbox, "my-app", listing_cache)
 
-                for item in items:
+        if not files_to_download:
 
-                    item_path = (
-                        f"{directory_path}/{item.name}" if directory_path else item.name
-                    )
+            files_to_download = await _scan_sandbox_files(sandbox, "", listing_cache)
 
-                    if item.name == "node_modules":
+        if not files_to_download:
+            raise HTTPException(status_code=404, detail="No files found in sandbox")
 
-                        continue
+        return StreamingResponse(
+            _iter_zip(files_to_download),
+            media_type="application/zip",
+            headers=headers,
+        )
 
-                    try:
+    except HTTPException:
+        raise
+    except Exception as e:
 
-                        sub_items = sandbox.files.list(item_path)
+        raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
 
-                        scan_directory_recursive(item_path)
-                    except:
 
-                        try:
-                            content = sandbox.files.read(item_path)
-                            if content and content.strip():
+# Vite emits <link href=".../assets/x.css"> and <script src=".../assets/x.js">;
+# one alternation captures either basename so a single scan inlines every bundle.
+_ASSET_REF_RE = re.compile(
+    r'<link[^>]*href="[^"]*?([^"/]+\.css)"[^>]*>'
+    r'|<script[^>]*src="[^"]*?([^"/]+\.js)"[^>]*></script>'
+)
 
-                                clean_path = item_path.replace("my-app/", "")
-                                files_to_download[clean_path] = content
 
-                        except Exception as e:
+# Any "</script" inside inline JS would end the element early; "<\/script" is
+# the same string to the JS parser.
+_SCRIPT_CLOSE_RE = re.compile(r"</(script)", re.IGNORECASE)
 
-                            continue
 
-            except Exception as e:
-                print(f"⚠️ Could not scan directory {directory_path}: {e}")
+def _escape_inline_js(js: str) -> str:
+    """Make bundle text safe to embed verbatim inside a <script> element."""
+    return _SCRIPT_CLOSE_RE.sub(r"<\\/\1", js)
 
-        scan_directory_recursive("my-app")
 
-        if not files_to_download:
+def _inline_assets(html: str, css_tags: Dict[str, str], js_tags: Dict[str, str]) -> str:
+    """Swap asset references for the given inline tags, keyed by asset basename."""
 
-            scan_directory_recursive("")
+    def repl(m: re.Match) -> str:
+        if m.group(1):
+            return css_tags.get(m.group(1), m.group(0))
+        return js_tags.get(m.group(2), m.group(0))
 
-        if not files_to_download:
-            raise HTTPException(status_code=404, detail="No files found in sandbox")
+    return _ASSET_REF_RE.sub(repl, html)
 
-        zip_buffer = io.BytesIO()
 
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            for file_path, content in files_to_download.items():
-                zip_file.writestr(file_path, content)
-
-        zip_buffer.seek(0)
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"project_{conversation_id[:8]}_{timestamp}.zip"
+# Fingerprint of everything that feeds `npm run build` (sources, configs, public/)
+_SOURCE_HASH_CMD = (
+    "cd my-app && find . -path ./node_modules -prune -o -path ./dist -prune "
+    "-o -type f -print0 | sort -z | xargs -0 sha1sum | sha1sum | cut -d' ' -f1"
+)
 
-        return StreamingResponse(
-            io.BytesIO(zip_buffer.read()),
-            media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
-        )
 
-    except HTTPException:
-        raise
+async def _sandbox_source_hash(sandbox) -> str | None:
+    """Hash the project sources in the sandbox, or None if it can't be computed."""
+    try:
+        result = await _async_sandbox_command(sandbox, _SOURCE_HASH_CMD, 30)
     except Exception as e:
-
-        raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
+        logger.warning(f"⚠️ Could not hash sandbox sources: {e}")
+        return None
+    if result.exit_code != 0:
+        return None
+    return result.stdout.strip() or None
+
+
+# Clean, build and list the emitted assets in one sandbox round-trip. npm's
+# log goes to stderr so stdout carries only NUL-separated asset names.
+_BUILD_AND_LIST_CMD = (
+    "cd my-app && rm -rf dist && npm run build 1>&2 && "
+    "{ find dist/assets -maxdepth 1 -type f -printf '%f\\0' 2>/dev/null || true; }"
+)
 
 
-import os
-from fastapi.responses import StreamingResponse
-import io
+def _split_asset_names(stdout: str | None) -> list[str]:
+    """Parse NUL-separated file names from `find -printf '%f\\0'` output."""
+    return [name for name in (stdout or "").split("\0") if name]
 
 
-from nodes.apply_to_Sandbox_node import (
-    _get_session_sandbox,
-    _async_sandbox_command,
-    _async_sandbox_file_read,
-)
-import re
+def _render_single_html(
+    html: str, css_assets: Dict[str, str], js_assets: Dict[str, str]
+) -> bytes:
+    """Inline bundle contents (keyed by basename) into index.html and encode it."""
+    css_tags = {fname: f"<style>{css}</style>" for fname, css in css_assets.items()}
+    js_tags = {
+        fname: f'<script type="module">{_escape_inline_js(js)}</script>'
+        for fname, js in js_assets.items()
+    }
+    return _inline_assets(html, css_tags, js_tags).encode("utf-8")
 
-import re
 
+async def _build_single_html(sandbox) -> bytes:
+    """Rebuild the project and return index.html with its CSS/JS inlined, encoded."""
+    logger.info("🔨 Rebuilding project from active sandbox...")
 
-async def build_single_file_html_from_sandbox(
-    sandbox, dist_dir: str = "my-app/dist"
-) -> str:
-    index_html = await _async_sandbox_file_read(sandbox, f"{dist_dir}/index.html")
-    html = index_html
+    build_result = await _async_sandbox_command(sandbox, _BUILD_AND_LIST_CMD, 300)
+    if build_result.exit_code != 0:
+        raise HTTPException(status_code=500, detail="Build failed")
 
-    assets_dir = f"{dist_dir}/assets"
+    try:
+        html = await _async_sandbox_file_read(sandbox, "my-app/dist/index.html")
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Could not read index.html: {str(e)}"
+        )
 
-    asset_files = await _async_sandbox_command(sandbox, f"ls {assets_dir}", 30)
-    if asset_files.exit_code != 0:
-        return html
+    asset_files = _split_asset_names(build_result.stdout)
+
+    if asset_files:
+
+        logger.debug(f"Found {len(asset_files)} asset files: {asset_files}")
+
+        css_names = [f for f in asset_files if f.endswith(".css")]
+        js_names = [f for f in asset_files if f.endswith(".js")]
+
+        # Fetch every asset in one round of concurrent reads
+        css_contents, js_contents = await asyncio.gather(
+            asyncio.gather(
+                *[
+                    _async_sandbox_file_read(sandbox, f"my-app/dist/assets/{f}")
+                    for f in css_names
+                ],
+                return_exceptions=True,
+            ),
+            asyncio.gather(
+                *[
+                    _async_sandbox_file_read(sandbox, f"my-app/dist/assets/{f}")
+                    for f in js_names
+                ],
+                return_exceptions=True,
+            ),
+        )
 
-    for fname in asset_files.stdout.splitlines():
-        if fname.endswith(".css"):
-            css_content = await _async_sandbox_file_read(
-                sandbox, f"{assets_dir}/{fname}"
-            )
-            html = re.sub(
-                rf"<link[^>]+{fname}[^>]*>", f"<style>{css_content}</style>", html
-            )
-        elif fname.endswith(".js"):
-            js_content = await _async_sandbox_file_read(
-                sandbox, f"{assets_dir}/{fname}"
-            )
-            html = re.sub(
-                rf"<script[^>]+{fname}[^>]*></script>",
-                f'<script type="module">{js_content}</script>',
-                html,
-            )
+        css_assets: Dict[str, str] = {}
+        for fname, css_content in zip(css_names, css_contents):
+            if isinstance(css_content, Exception):
+                logger.warning(f"⚠️ Could not inline CSS {fname}: {css_content}")
+                continue
+            if css_content:
+                css_assets[fname] = css_content
+                logger.info(f"✅ Inlined CSS: {fname}")
 
-    return html
+        js_assets: Dict[str, str] = {}
+        for fname, js_content in zip(js_names, js_contents):
+            if isinstance(js_content, Exception):
+                logger.warning(f"⚠️ Could not inline JS {fname}: {js_content}")
+                continue
+            if js_content:
+                js_assets[fname] = js_content
+                logger.info(f"✅ Inlined JS: {fname}")
 
+        # Escaping and splicing multi-MB bundles is CPU work; keep it off the loop
+        return await asyncio.to_thread(_render_single_html, html, css_assets, js_assets)
 
-from nodes.apply_to_Sandbox_node import (
-    _get_session_sandbox,
-    _async_sandbox_command,
-    _async_sandbox_file_read,
-    _create_fast_vite_project,
-    _is_project_setup,
-)
+    return html.encode("utf-8")
 
 
 @app.get("/api/sessions/{session_id}/conversations/{conversation_id}/download-html")
@@ -1106,111 +1680,23 @@ async def download_single_html(session_id: str, conversation_id: str):
         raise HTTPException(status_code=404, detail="Sandbox not found")
 
     try:
-        print(f"📄 Creating single HTML file for conversation: {conversation_id}")
-
-        print("🔨 Rebuilding project from active sandbox...")
+        logger.info(f"📄 Creating single HTML file for conversation: {conversation_id}")
 
-        await _async_sandbox_command(sandbox, "rm -rf my-app/dist", 30)
-        build_result = await _async_sandbox_command(
-            sandbox, "cd my-app && npm run build", 300
-        )
-        if build_result.exit_code != 0:
-            raise HTTPException(status_code=500, detail="Build failed")
-
-        try:
-            html = await _async_sandbox_file_read(sandbox, "my-app/dist/index.html")
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Could not read index.html: {str(e)}"
-            )
-
-        assets_result = await _async_sandbox_command(
-            sandbox, "ls my-app/dist/assets/", 30
-        )
-
-        if assets_result.exit_code == 0 and assets_result.stdout.strip():
-            asset_files = [
-                f.strip() for f in assets_result.stdout.strip().split("\n") if f.strip()
-            ]
-
-            print(f"Found {len(asset_files)} asset files: {asset_files}")
-
-            for fname in asset_files:
-                if fname.endswith(".css"):
-                    try:
-                        css_content = await _async_sandbox_file_read(
-                            sandbox, f"my-app/dist/assets/{fname}"
-                        )
-                        if css_content:
-
-                            import re
-
-                            css_pattern = (
-                                rf'<link[^>]*href="[^"]*{re.escape(fname)}"[^>]*>'
-                            )
-                            replacement = f"<style>{css_content}</style>"
-                            html = re.sub(css_pattern, replacement, html)
-                            print(f"✅ Inlined CSS: {fname}")
-                    except Exception as e:
-                        print(f"⚠️ Could not inline CSS {fname}: {e}")
-
-            for fname in asset_files:
-                if fname.endswith(".js"):
-                    try:
-                        js_content = await _async_sandbox_file_read(
-                            sandbox, f"my-app/dist/assets/{fname}"
-                        )
-                        if js_content:
-
-                            try:
-
-                                js_content_escaped = js_content.replace(
-                                    "\\", "\\\\"
-                                ).replace("</script>", "<\/script>")
-
-                                import re
-
-                                js_pattern = rf'<script[^>]*src="[^"]*{re.escape(fname)}"[^>]*></script>'
-                                replacement = f'<script type="module">{js_content_escaped}</script>'
-                                html = re.sub(js_pattern, replacement, html)
-                                print(f"✅ Inlined JS: {fname}")
-                            except Exception as escape_error:
-
-                                print(
-                                    f"⚠️ Unicode escape issue with {fname}, trying base64 approach..."
-                                )
-                                import base64
-
-                                js_b64 = base64.b64encode(
-                                    js_content.encode("utf-8")
-                                ).decode("ascii")
-
-                                js_pattern = rf'<script[^>]*src="[^"]*{re.escape(fname)}"[^>]*></script>'
-                                replacement = f"""<script type="module">
-                                // Decoded from base64 due to Unicode escape issues
-                                (function() {{
-                                    const jsCode = atob("{js_b64}");
-                                    const script = document.createElement('script');
-                                    script.type = 'module';
-                                    script.text = jsCode;
-                                    document.head.appendChild(script);
-                                }})();
-                                </script>"""
-                                html = re.sub(js_pattern, replacement, html)
-                                print(f"✅ Inlined JS with base64: {fname}")
-                    except Exception as e:
-                        print(f"⚠️ Could not inline JS {fname}: {e}")
-
-        from datetime import datetime
-        from datetime import datetime
-        import zipfile
-        import io
+        src_hash = await _sandbox_source_hash(sandbox)
+        cached = get_cached_html(session_id, src_hash) if src_hash else None
+        if cached is not None:
+            logger.info("♻️ Sources unchanged since last build, reusing cached HTML")
+            html_bytes = cached
+        else:
+            html_bytes = await _build_single_html(sandbox)
+            if src_hash:
+                cache_html(session_id, src_hash, html_bytes)
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"index_{conversation_id[:8]}_{timestamp}.txt"
 
         return StreamingResponse(
-            io.BytesIO(html.encode("utf-8")),
+            io.BytesIO(html_bytes),
             media_type="text/plain",
             headers={"Content-Disposition": f"attachment; filename={filename}"},
         )
@@ -1218,10 +1704,7 @@ async def download_single_html(session_id: str, conversation_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ HTML download error: {e}")
-        import traceback
-
-        traceback.print_exc()
+        logger.exception(f"❌ HTML download error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create HTML: {str(e)}")
 
 
@@ -1229,17 +1712,15 @@ async def download_single_html(session_id: str, conversation_id: str):
 async def cleanup_session_sandbox(session_id: str):
     """Clean up sandbox for a specific session"""
     try:
-        from nodes.apply_to_Sandbox_node import cleanup_session_sandbox
-
-        print(f"🧹 Cleaning up sandbox for session: {session_id}")
-        cleanup_session_sandbox(session_id)
+        logger.info(f"🧹 Cleaning up sandbox for session: {session_id}")
+        await asyncio.to_thread(_cleanup_session_sandbox, session_id)
 
         return {
             "success": True,
             "message": f"Sandbox for session {session_id} cleaned up",
         }
     except Exception as e:
-        print(f"❌ Session cleanup failed: {e}")
+        logger.error(f"❌ Session cleanup failed: {e}")
         return {"success": False, "error": str(e)}
 
 
@@ -1247,8 +1728,6 @@ async def cleanup_session_sandbox(session_id: str):
 async def get_session_status(session_id: str):
     """Get session sandbox status"""
     try:
-        from nodes.apply_to_Sandbox_node import _get_session_sandbox, _get_session_info
-
         sandbox = _get_session_sandbox(session_id)
         info = _get_session_info(session_id)
 
@@ -1263,30 +1742,44 @@ async def get_session_status(session_id: str):
 
 
 @app.post("/api/message")
-async def save_message(session_id: str = Form(...), message: str = Form(...)):
+async def save_message(
+    session_id: str = Form(...),
+    message: str = Form(...),
+    db: AsyncSession = Depends(get_async_db),
+):
     """Save a message to the database"""
     try:
-        from db import db_session
-        from models import Message
-
-        with db_session() as db:
-            message_obj = Message(
-                id=str(uuid.uuid4()),
-                session_id=session_id,
-                role="user",
-                content=message,
-                created_at=datetime.utcnow(),
-            )
-            db.add(message_obj)
-            db.commit()
+        await async_ensure_session(db, session_id)
+        message_obj = Message(
+            id=str(uuid.uuid4()),
+            session_id=session_id,
+            role="user",
+            content=message,
+            created_at=datetime.utcnow(),
+        )
+        db.add(message_obj)
+        await db.commit()
 
-            return {"success": True, "message_id": message_obj.id}
+        return {"success": True, "message_id": message_obj.id}
     except Exception as e:
-        print(f"Error saving message: {e}")
+        logger.error(f"Error saving message: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 if __name__ == "__main__":
-    import uvicorn
-
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, log_level="info")
+    # Each worker is a fresh process that builds its own engines and checkpointer
+    # in lifespan. Request status polling, cancellation and sandbox handles are
+    # per-process, so >1 worker needs session-sticky routing in front.
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    # uvloop is not available on Windows; uvicorn's asyncio loop is the fallback there
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=workers,
+        reload=workers == 1
+        and os.getenv("UVICORN_RELOAD", "true").lower() == "true",
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        log_level="info",
+    )
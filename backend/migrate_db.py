@@ -1,8 +1,57 @@
 # migrate_db.py - Database migration script
+import re
 import sqlite3
 import os
 from datetime import datetime
 
+# Child tables whose foreign keys should cascade when their parent row is deleted
+CASCADE_TABLES = [
+    "messages",
+    "logos",
+    "images",
+    "conversation_history",
+    "session_generated_links",
+]
+
+_REFERENCES_RE = re.compile(
+    r'(REFERENCES\s+"?\w+"?\s*\(\s*"?\w+"?\s*\))(?!\s+ON\s+DELETE)', re.IGNORECASE
+)
+
+
+def _ensure_cascade(cursor, table):
+    """Rebuild a table so every foreign key uses ON DELETE CASCADE (SQLite can't ALTER constraints)."""
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    row = cursor.fetchone()
+    if row is None:
+        return
+
+    cursor.execute(f"PRAGMA foreign_key_list({table})")
+    fks = cursor.fetchall()
+    if not fks or all(fk[6].upper() == "CASCADE" for fk in fks):
+        return
+
+    print(f"Adding ON DELETE CASCADE to {table} foreign keys...")
+    create_sql = _REFERENCES_RE.sub(r"\1 ON DELETE CASCADE", row[0])
+    create_sql = re.sub(
+        rf'^CREATE TABLE\s+(IF NOT EXISTS\s+)?"?{table}"?',
+        f"CREATE TABLE {table}__cascade",
+        create_sql,
+        count=1,
+    )
+
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+        (table,),
+    )
+    index_sqls = [r[0] for r in cursor.fetchall()]
+
+    cursor.execute(create_sql)
+    cursor.execute(f"INSERT INTO {table}__cascade SELECT * FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {table}__cascade RENAME TO {table}")
+    for index_sql in index_sqls:
+        cursor.execute(index_sql)
+
 def migrate_database():
     """Migrate the existing database to add new columns and tables"""
     
@@ -51,8 +100,8 @@ def migrate_database():
                 generation_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
                 is_edit BOOLEAN DEFAULT 0,
                 meta JSON,
-                FOREIGN KEY (session_id) REFERENCES sessions (id),
-                FOREIGN KEY (message_id) REFERENCES messages (id)
+                FOREIGN KEY (session_id) REFERENCES sessions (id) ON DELETE CASCADE,
+                FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE
             )
         """)
         
@@ -68,8 +117,8 @@ def migrate_database():
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 is_active BOOLEAN DEFAULT 1,
                 meta JSON,
-                FOREIGN KEY (session_id) REFERENCES sessions (id),
-                FOREIGN KEY (conversation_id) REFERENCES conversation_history (id)
+                FOREIGN KEY (session_id) REFERENCES sessions (id) ON DELETE CASCADE,
+                FOREIGN KEY (conversation_id) REFERENCES conversation_history (id) ON DELETE CASCADE
             )
         """)
         
@@ -79,10 +128,19 @@ def migrate_database():
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversation_history_message_id ON conversation_history (message_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_generated_links_session_id ON session_generated_links (session_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_generated_links_conversation_id ON session_generated_links (conversation_id)")
+        # Per-session count/max lookups for the session list
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_messages_session_id_created_at ON messages (session_id, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_conversation_history_session_id_ts ON conversation_history (session_id, generation_timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_session_generated_links_session_id_created_at ON session_generated_links (session_id, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_sessions_updated_at ON sessions (updated_at)")
         
         # Update existing sessions to have updated_at = created_at
         print("Updating existing sessions...")
         cursor.execute("UPDATE sessions SET updated_at = created_at WHERE updated_at IS NULL")
+
+        # Let the database clean up child rows when a session is deleted
+        for table in CASCADE_TABLES:
+            _ensure_cascade(cursor, table)
         
         # Commit all changes
         conn.commit()
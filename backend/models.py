@@ -1,13 +1,14 @@
 # models.py
 from datetime import datetime
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, DateTime, JSON, Text, ForeignKey, Integer, Boolean
+from sqlalchemy import String, DateTime, JSON, Text, ForeignKey, Integer, Boolean, Index
 
 class Base(DeclarativeBase):
     pass
 
 class Session(Base):
     __tablename__ = "sessions"
+    __table_args__ = (Index("ix_sessions_updated_at", "updated_at"),)
     id: Mapped[str] = mapped_column(String(64), primary_key=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -16,8 +17,9 @@ class Session(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_session_id_created_at", "session_id", "created_at"),)
     id: Mapped[str] = mapped_column(String(80), primary_key=True)
-    session_id: Mapped[str] = mapped_column(String(64), ForeignKey("sessions.id"), index=True)
+    session_id: Mapped[str] = mapped_column(String(64), ForeignKey("sessions.id", ondelete="CASCADE"), index=True)
     role: Mapped[str] = mapped_column(String(16))  # user | assistant | system
     content: Mapped[str] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -26,7 +28,7 @@ class Message(Base):
 class Logo(Base):
     __tablename__ = "logos"
     id: Mapped[str] = mapped_column(String(80), primary_key=True)
-    session_id: Mapped[str] = mapped_column(String(64), ForeignKey("sessions.id"), index=True)
+    session_id: Mapped[str] = mapped_column(String(64), ForeignKey("sessions.id", ondelete="CASCADE"), index=True)
     filename: Mapped[str] = mapped_column(String(255))
     original_name: Mapped[str] = mapped_column(String(255))
     file_path: Mapped[str] = mapped_column(String(500))
@@ -38,9 +40,12 @@ class Logo(Base):
 
 class ConversationHistory(Base):
     __tablename__ = "conversation_history"
+    __table_args__ = (
+        Index("ix_conversation_history_session_id_ts", "session_id", "generation_timestamp"),
+    )
     id: Mapped[str] = mapped_column(String(80), primary_key=True)
-    session_id: Mapped[str] = mapped_column(String(64), ForeignKey("sessions.id"), index=True)
-    message_id: Mapped[str] = mapped_column(String(80), ForeignKey("messages.id"), index=True)
+    session_id: Mapped[str] = mapped_column(String(64), ForeignKey("sessions.id", ondelete="CASCADE"), index=True)
+    message_id: Mapped[str] = mapped_column(String(80), ForeignKey("messages.id", ondelete="CASCADE"), index=True)
     user_query: Mapped[str] = mapped_column(Text)
     ai_response: Mapped[str | None] = mapped_column(Text, nullable=True)
     generated_code: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -51,9 +56,12 @@ class ConversationHistory(Base):
 
 class SessionGeneratedLinks(Base):
     __tablename__ = "session_generated_links"
+    __table_args__ = (
+        Index("ix_session_generated_links_session_id_created_at", "session_id", "created_at"),
+    )
     id: Mapped[str] = mapped_column(String(80), primary_key=True)
-    session_id: Mapped[str] = mapped_column(String(64), ForeignKey("sessions.id"), index=True)
-    conversation_id: Mapped[str] = mapped_column(String(80), ForeignKey("conversation_history.id"), index=True)
+    session_id: Mapped[str] = mapped_column(String(64), ForeignKey("sessions.id", ondelete="CASCADE"), index=True)
+    conversation_id: Mapped[str] = mapped_column(String(80), ForeignKey("conversation_history.id", ondelete="CASCADE"), index=True)
     sandbox_url: Mapped[str] = mapped_column(String(500))
     generated_code: Mapped[str] = mapped_column(Text)
     generation_number: Mapped[int] = mapped_column(Integer, default=1)
@@ -64,7 +72,7 @@ class SessionGeneratedLinks(Base):
 class Image(Base):
     __tablename__ = "images"
     id: Mapped[str] = mapped_column(String(80), primary_key=True)
-    session_id: Mapped[str] = mapped_column(String(64), ForeignKey("sessions.id"), index=True)
+    session_id: Mapped[str] = mapped_column(String(64), ForeignKey("sessions.id", ondelete="CASCADE"), index=True)
     filename: Mapped[str] = mapped_column(String(255))
     original_name: Mapped[str] = mapped_column(String(255))
     file_path: Mapped[str] = mapped_column(String(500))
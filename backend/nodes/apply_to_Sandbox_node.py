@@ -1,5 +1,6 @@
 import os
 import re
+import json
 import time
 from typing import Dict, Any, Optional, List
 
@@ -16,13 +17,20 @@ _sandbox_lock = threading.Lock()
 
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 
 _session_exec_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
 
 
 _executor = ThreadPoolExecutor(max_workers=10)
 
+# session_id -> (source hash, rendered HTML) of the last single-file export. Each
+# entry is a multi-MB bundle, so keep only the most recently used few; entries
+# also go when the session's sandbox is cleaned up.
+HTML_CACHE_MAX_ENTRIES = 8
+_html_build_cache: "OrderedDict[str, tuple[str, bytes]]" = OrderedDict()
+_html_cache_lock = threading.Lock()
+
 
 async def _async_sandbox_command(sandbox, command: str, timeout: int = 30):
     """Run sandbox command asynchronously"""
@@ -46,6 +54,12 @@ async def _async_sandbox_file_read(sandbox, path: str):
     return await loop.run_in_executor(_executor, lambda: sandbox.files.read(path))
 
 
+async def _async_sandbox_file_list(sandbox, path: str):
+    """List directory asynchronously"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(_executor, lambda: sandbox.files.list(path))
+
+
 def _get_session_sandbox(session_id: str):
     """Get sandbox for a specific session."""
     with _sandbox_lock:
@@ -1376,15 +1390,11 @@ async def _capture_complete_application_state(sandbox) -> Dict[str, Any]:
 
         for file_path, content in complete_state["complete_files"].items():
 
-            escaped_content = (
-                content.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
-            )
+            # A JSON string (ensure_ascii=False) is also a valid Python literal
+            literal = json.dumps(content, ensure_ascii=False)
             script_lines.append(f"    # Recreate {file_path}")
             script_lines.append(
-                f'    {file_path.replace("/", "_").replace(".", "_")}_content = """{escaped_content}"""'
-            )
-            script_lines.append(
-                f'    sandbox.files.write("my-app/{file_path}", {file_path.replace("/", "_").replace(".", "_")}_content)'
+                f"    sandbox.files.write({json.dumps('my-app/' + file_path)}, {literal})"
             )
             script_lines.append(f'    print(f"✅ Recreated {file_path}")')
 
@@ -1757,21 +1767,51 @@ async def _apply_edit_changes(correction_data: Dict[str, Any], session_id: str)
         return False
 
 
+def _kill_sandbox(session_id: str, sandbox) -> None:
+    try:
+        sandbox.kill()
+
+    except Exception as e:
+        print(f"⚠️ Error cleaning up sandbox for session {session_id}: {e}")
+
+
+def get_cached_html(session_id: str, src_hash: str) -> Optional[bytes]:
+    """Cached single-file HTML for the session if it was built from src_hash."""
+    with _html_cache_lock:
+        entry = _html_build_cache.get(session_id)
+        if entry is None or entry[0] != src_hash:
+            return None
+        _html_build_cache.move_to_end(session_id)
+        return entry[1]
+
+
+def cache_html(session_id: str, src_hash: str, html: bytes) -> None:
+    """Remember a session's single-file HTML, evicting the least recently used."""
+    with _html_cache_lock:
+        _html_build_cache[session_id] = (src_hash, html)
+        _html_build_cache.move_to_end(session_id)
+        while len(_html_build_cache) > HTML_CACHE_MAX_ENTRIES:
+            _html_build_cache.popitem(last=False)
+
+
 def cleanup_session_sandbox(session_id: str):
     """Clean up sandbox for a specific session"""
+    with _html_cache_lock:
+        _html_build_cache.pop(session_id, None)
+    # Detach under the lock, kill outside it: kill() is a network call
     with _sandbox_lock:
-        if session_id in _session_sandboxes:
-            sandbox = _session_sandboxes[session_id]["sandbox"]
-            try:
-                sandbox.kill()
-
-            except Exception as e:
-                print(f"⚠️ Error cleaning up sandbox for session {session_id}: {e}")
-            del _session_sandboxes[session_id]
+        entry = _session_sandboxes.pop(session_id, None)
+    if entry:
+        _kill_sandbox(session_id, entry["sandbox"])
 
 
 def cleanup_all_sessions():
     """Clean up all session sandboxes"""
+    with _html_cache_lock:
+        _html_build_cache.clear()
+    # _sandbox_lock is not re-entrant, so don't call cleanup_session_sandbox under it
     with _sandbox_lock:
-        for session_id in list(_session_sandboxes.keys()):
-            cleanup_session_sandbox(session_id)
+        entries = list(_session_sandboxes.items())
+        _session_sandboxes.clear()
+    for session_id, entry in entries:
+        _kill_sandbox(session_id, entry["sandbox"])
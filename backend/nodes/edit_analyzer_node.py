@@ -1,4 +1,5 @@
 # nodes/edit_analyzer.py
+import asyncio
 import mimetypes
 from typing import Dict, Any, List
 from graph_types import GraphState
@@ -138,7 +139,9 @@ async def _call_openai_vision_responses(image_url: str, prompt: str) -> str:
     Returns resp.output_text (string).
     """
     img = await _prepare_image_for_responses(image_url)
-    resp = _client.responses.create(
+    # The sync client would block the event loop for the whole vision call.
+    resp = await asyncio.to_thread(
+        _client.responses.create,
         model="gpt-4o",
         input=[
             {
@@ -584,7 +587,7 @@ async def _generate_images_for_edit(
             if not description:
                 continue
 
-            urls = _generate_high_quality_images_from_pexels(
+            urls = await _generate_high_quality_images_from_pexels(
                 description=description,
                 context=context,
                 category=category,
@@ -1,8 +1,9 @@
 # nodes/photo_generator_node.py
+import asyncio
 import json
 import os
 import csv
-import requests
+import httpx
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 from llm import get_chat_model
@@ -35,7 +36,7 @@ async def photo_generator(state: Dict[str, Any]) -> Dict[str, Any]:
 
     if needed_images:
 
-        _generate_and_save_new_images(needed_images)
+        await _generate_and_save_new_images(needed_images)
     else:
         print("✅ All required images already exist in database")
 
@@ -459,21 +460,26 @@ Example:
         return image_requirements
 
 
-def _generate_and_save_new_images(needed_images: List[Dict[str, Any]]):
+async def _generate_and_save_new_images(needed_images: List[Dict[str, Any]]):
     """
     Generate new images using Pexels API and save them to CSV.
     """
+    # Searches are independent network calls; only the CSV writes need to be ordered
+    results = await asyncio.gather(
+        *(
+            _generate_high_quality_images_from_pexels(
+                req["description"], req["context"], req["category"]
+            )
+            for req in needed_images
+        )
+    )
 
-    for req in needed_images:
+    for req, image_urls in zip(needed_images, results):
         description = req["description"]
         website_type = req["website_type"]
         context = req["context"]
         category = req["category"]
 
-        image_urls = _generate_high_quality_images_from_pexels(
-            description, context, category
-        )
-
         if image_urls:
             # Save to CSV
             _save_image_to_csv(description, website_type, context, category, image_urls)
@@ -482,7 +488,7 @@ def _generate_and_save_new_images(needed_images: List[Dict[str, Any]]):
             print(f"❌ Failed to generate images for: {description} ({category})")
 
 
-def _generate_high_quality_images_from_pexels(
+async def _generate_high_quality_images_from_pexels(
     description: str, context: str, category: str, max_images: int = 1
 ) -> List[str]:
     """
@@ -497,36 +503,36 @@ def _generate_high_quality_images_from_pexels(
     # Get multiple search strategies
     search_strategies = _get_search_strategies(description, context, category)
 
-    for search_query in search_strategies:
-        try:
-            params = {
-                "query": search_query,
-                "per_page": max_images,
-                "orientation": (
-                    "landscape" if category in ["banner", "photo"] else "all"
-                ),
-            }
+    # One client per lookup so the strategy fallbacks reuse a single connection
+    async with httpx.AsyncClient(headers=headers, timeout=30) as client:
+        for search_query in search_strategies:
+            try:
+                params = {
+                    "query": search_query,
+                    "per_page": max_images,
+                    "orientation": (
+                        "landscape" if category in ["banner", "photo"] else "all"
+                    ),
+                }
 
-            response = requests.get(
-                f"{PEXELS_BASE_URL}/search", headers=headers, params=params
-            )
-            response.raise_for_status()
+                response = await client.get(f"{PEXELS_BASE_URL}/search", params=params)
+                response.raise_for_status()
 
-            data = response.json()
+                data = response.json()
 
-            if data.get("photos") and len(data["photos"]) > 0:
-                image_urls = []
-                for photo in data["photos"][:max_images]:
+                if data.get("photos") and len(data["photos"]) > 0:
+                    image_urls = []
+                    for photo in data["photos"][:max_images]:
 
-                    image_urls.append(photo["src"]["large2x"])
+                        image_urls.append(photo["src"]["large2x"])
 
-                return image_urls
-            else:
-                print(f"⚠️ No results for query: '{search_query}'")
+                    return image_urls
+                else:
+                    print(f"⚠️ No results for query: '{search_query}'")
 
-        except Exception as e:
+            except Exception as e:
 
-            continue
+                continue
 
     return _generate_placeholder_urls(description, category, max_images)
 
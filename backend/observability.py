@@ -59,6 +59,7 @@ import inspect
 from typing import Any, Callable
 from functools import wraps
 from langsmith import traceable
+from langsmith.utils import tracing_is_enabled
 
 def trace_node(node_func: Callable, node_name: str) -> Callable:
     """Decorator to trace individual nodes in the graph (supports sync + async)."""
@@ -67,6 +68,10 @@ def trace_node(node_func: Callable, node_name: str) -> Callable:
         # Async version
         @wraps(node_func)
         async def async_wrapper(state: dict[str, Any]) -> dict[str, Any]:
+            # No run tree to attach to; skip building a traced wrapper per call
+            if not tracing_is_enabled():
+                return await node_func(state)
+
             @traceable(
                 name=node_name,
                 run_type="chain",
@@ -75,7 +80,7 @@ def trace_node(node_func: Callable, node_name: str) -> Callable:
                     "node_name": node_name,
                     "session_id": state.get("session_id"),
                     "thread_id": state.get("session_id"),
-                    "input_keys": list(state.keys()) if isinstance(state, dict) else [],
+                    "input_keys": list(state) if isinstance(state, dict) else [],
                     "timestamp": state.get("timestamp"),
                 }
             )
@@ -90,6 +95,9 @@ def trace_node(node_func: Callable, node_name: str) -> Callable:
         # Sync version
         @wraps(node_func)
         def sync_wrapper(state: dict[str, Any]) -> dict[str, Any]:
+            if not tracing_is_enabled():
+                return node_func(state)
+
             @traceable(
                 name=node_name,
                 run_type="chain",
@@ -98,7 +106,7 @@ def trace_node(node_func: Callable, node_name: str) -> Callable:
                     "node_name": node_name,
                     "session_id": state.get("session_id"),
                     "thread_id": state.get("session_id"),
-                    "input_keys": list(state.keys()) if isinstance(state, dict) else [],
+                    "input_keys": list(state) if isinstance(state, dict) else [],
                     "timestamp": state.get("timestamp"),
                 }
             )
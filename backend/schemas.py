@@ -1,5 +1,5 @@
 # schemas.py
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -13,3 +13,55 @@ class UserQueryOut(BaseModel):
     session_id: str
     accepted: bool
     state: Dict[str, Any]
+
+class SessionSummaryOut(BaseModel):
+    id: str
+    title: str
+    created_at: datetime
+    updated_at: datetime
+    message_count: int
+    last_activity: Optional[datetime] = None
+    meta: Dict[str, Any]
+
+class SessionListOut(BaseModel):
+    sessions: List[SessionSummaryOut]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
+
+class SessionOut(BaseModel):
+    id: str
+    title: str
+    created_at: datetime
+    updated_at: datetime
+    meta: Dict[str, Any]
+
+class MessageOut(BaseModel):
+    id: str
+    role: str
+    content: str
+    created_at: datetime
+    meta: Optional[Dict[str, Any]] = None
+
+class ConversationOut(BaseModel):
+    id: str
+    user_query: str
+    ai_response: Optional[str] = None
+    generated_code: Optional[str] = None
+    sandbox_url: Optional[str] = None
+    generation_timestamp: datetime
+    is_edit: bool
+    meta: Optional[Dict[str, Any]] = None
+
+class GeneratedLinkOut(BaseModel):
+    id: str
+    sandbox_url: str
+    generated_code: str
+    generation_number: int
+    created_at: datetime
+    is_active: bool
+    meta: Optional[Dict[str, Any]] = None
+
+class SessionDetailsOut(BaseModel):
+    session: SessionOut
+    messages: List[MessageOut]
+    conversations: List[ConversationOut]
+    generated_links: List[GeneratedLinkOut]
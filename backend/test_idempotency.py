@@ -0,0 +1,106 @@
+# test_idempotency.py
+"""
+Idempotency-Key handling in POST /api/query: a retry with the same key must
+never start a second graph run, whether it arrives while the first request is
+still saving uploads or after the run has finished.
+"""
+
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@asynccontextmanager
+async def _no_lifespan(app):
+    yield
+
+
+@pytest.fixture
+def runs(client, monkeypatch):
+    """Record graph runs instead of executing the graph."""
+    calls = []
+
+    async def fake_process_query_request(session_id, text, *args):
+        calls.append(session_id)
+        return {"session_id": session_id, "text": text}
+
+    monkeypatch.setattr(main, "process_query_request", fake_process_query_request)
+    monkeypatch.setattr(main, "_running_requests", {})
+    return calls
+
+
+@pytest.fixture
+def live_client(client, monkeypatch):
+    """One event loop for every request, so run tasks outlive the request that made them."""
+    monkeypatch.setattr(main.app.router, "lifespan_context", _no_lifespan)
+    with TestClient(main.app) as c:
+        yield c
+
+
+def _query(c, key, text="Build a landing page"):
+    return c.post("/api/query", data={"text": text}, headers={"Idempotency-Key": key})
+
+
+def _wait_until_done(c, session_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = c.get(f"/api/requests/status/{session_id}").json()["status"]
+        if status != "running":
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"run for {session_id} did not finish")
+
+
+def test_same_key_after_completion_reuses_run(runs, live_client):
+    key = str(uuid.uuid4())
+
+    first = _query(live_client, key)
+    assert first.status_code == 200
+    session_id = first.json()["session_id"]
+    assert session_id == key
+    assert _wait_until_done(live_client, session_id) == "completed"
+
+    retry = _query(live_client, key.upper())
+    assert retry.status_code == 200
+    assert retry.json()["session_id"] == session_id
+    assert retry.json()["status"] == "completed"
+    assert runs == [session_id]
+
+
+def test_concurrent_same_key_starts_one_run(runs, live_client, monkeypatch):
+    async def slow_no_upload():
+        # Holds the first request inside its awaited upload step
+        await asyncio.sleep(0.2)
+
+    monkeypatch.setattr(main, "_no_upload", slow_no_upload)
+    key = str(uuid.uuid4())
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        responses = list(pool.map(lambda _: _query(live_client, key), range(2)))
+
+    assert [r.status_code for r in responses] == [200, 200]
+    assert {r.json()["status"] for r in responses} == {"processing"}
+    assert _wait_until_done(live_client, key) == "completed"
+    assert runs == [key]
+
+
+def test_new_key_replaces_run(runs, live_client):
+    session_id = str(uuid.uuid4())
+
+    _query(live_client, session_id)
+    _wait_until_done(live_client, session_id)
+    live_client.post(
+        "/api/query",
+        data={"text": "Make it blue", "session_id": session_id},
+        headers={"Idempotency-Key": str(uuid.uuid4())},
+    )
+    _wait_until_done(live_client, session_id)
+
+    assert runs == [session_id, session_id]
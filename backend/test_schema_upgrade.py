@@ -0,0 +1,130 @@
+# test_schema_upgrade.py
+"""
+Startup upgrade of a legacy app.db: tables created before the foreign keys
+cascaded (and before the model indexes existed) are rebuilt by _init_schema,
+keep their rows, and let DELETE /api/sessions/{id} cascade to child rows.
+"""
+
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.schema import CreateTable
+
+import main
+from migrate_db import CASCADE_TABLES
+from models import Base
+
+# Rows per table, parents first; two sessions so the delete can be checked for overreach
+LEGACY_ROWS = {
+    "sessions": [
+        ("s1", "2025-01-01 00:00:00.000000", "2025-01-01 00:00:00.000000", "one", None),
+        ("s2", "2025-01-01 00:00:00.000000", "2025-01-01 00:00:00.000000", "two", None),
+    ],
+    "messages": [
+        ("m1", "s1", "user", "hi", "2025-01-01 00:00:00.000000", None),
+        ("m2", "s2", "user", "hi", "2025-01-01 00:00:00.000000", None),
+    ],
+    "conversation_history": [
+        ("c1", "s1", "m1", "q", None, None, None, "2025-01-01 00:00:00.000000", 0, None),
+        ("c2", "s2", "m2", "q", None, None, None, "2025-01-01 00:00:00.000000", 0, None),
+    ],
+    "session_generated_links": [
+        ("l1", "s1", "c1", "https://x", "code", 1, "2025-01-01 00:00:00.000000", 1, None),
+        ("l2", "s2", "c2", "https://x", "code", 1, "2025-01-01 00:00:00.000000", 1, None),
+    ],
+    "logos": [
+        ("g1", "s1", "f", "o", "/p", "/u", "image/png", 1, "2025-01-01 00:00:00.000000", None),
+    ],
+    "images": [
+        ("i1", "s1", "f", "o", "/p", "/u", "image/png", 1, "2025-01-01 00:00:00.000000", None),
+    ],
+}
+
+
+def _build_legacy_db(path):
+    """Create the tables as older releases did: no ON DELETE CASCADE, no indexes."""
+    conn = sqlite3.connect(path)
+    try:
+        for table in Base.metadata.sorted_tables:
+            ddl = str(CreateTable(table).compile(dialect=sqlite_dialect.dialect()))
+            conn.execute(ddl.replace(" ON DELETE CASCADE", ""))
+        for table, rows in LEGACY_ROWS.items():
+            marks = ", ".join("?" * len(rows[0]))
+            conn.executemany(f"INSERT INTO {table} VALUES ({marks})", rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _count(conn, table, session_id=None):
+    if session_id is None:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return conn.execute(
+        f"SELECT COUNT(*) FROM {table} WHERE {'id' if table == 'sessions' else 'session_id'} = ?",
+        (session_id,),
+    ).fetchone()[0]
+
+
+@pytest.fixture
+def legacy_db(db_path, monkeypatch):
+    _build_legacy_db(db_path)
+    monkeypatch.setattr(main, "_cascade_deletes", False)
+    return db_path
+
+
+def test_init_schema_upgrades_legacy_db(legacy_db):
+    main._init_schema()
+
+    conn = sqlite3.connect(legacy_db)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == main._SCHEMA_VERSION == 3
+        assert main._cascade_deletes is True
+
+        for table, rows in LEGACY_ROWS.items():
+            assert _count(conn, table) == len(rows), table
+
+        for table in CASCADE_TABLES:
+            fks = conn.execute(f"PRAGMA foreign_key_list({table})").fetchall()
+            assert fks and all(fk[6] == "CASCADE" for fk in fks), table
+
+        existing = {
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' AND sql IS NOT NULL"
+            )
+        }
+        expected = {ix.name for t in Base.metadata.sorted_tables for ix in t.indexes}
+        assert expected <= existing
+    finally:
+        conn.close()
+
+
+def test_second_start_skips_upgrade(legacy_db, monkeypatch):
+    main._init_schema()
+
+    def fail():
+        raise AssertionError("upgrade ran on a stamped DB")
+
+    monkeypatch.setattr(main, "_ensure_cascade_fks", fail)
+    monkeypatch.setattr(main, "_ensure_indexes", fail)
+    main._init_schema()
+    assert main._cascade_deletes is True
+
+
+def test_delete_session_cascades_after_upgrade(legacy_db):
+    main._init_schema()
+
+    resp = TestClient(main.app).delete("/api/sessions/s1")
+    assert resp.status_code == 200
+    assert resp.json() == {"message": "Session deleted successfully"}
+
+    conn = sqlite3.connect(legacy_db)
+    try:
+        for table in LEGACY_ROWS:
+            assert _count(conn, table, "s1") == 0, table
+        for table in ("sessions", "messages", "conversation_history", "session_generated_links"):
+            assert _count(conn, table, "s2") == 1, table
+    finally:
+        conn.close()
@@ -0,0 +1,87 @@
+# test_sessions_pagination.py
+"""
+Keyset pagination of GET /api/sessions: pages follow (updated_at, id) newest
+first, cursors round-trip without gaps or repeats even when sessions share an
+updated_at, and bad cursors / limits are rejected.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from db import db_session
+from models import Session
+
+BASE_TS = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def _add_sessions(rows):
+    """rows: (id, updated_at) pairs."""
+    with db_session() as db:
+        for session_id, updated_at in rows:
+            db.add(Session(id=session_id, created_at=BASE_TS, updated_at=updated_at))
+
+
+def _page_ids(client, **params):
+    resp = client.get("/api/sessions", params=params)
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    return [s["id"] for s in body["sessions"]], body["next_cursor"]
+
+
+def _walk(client, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        page, cursor = _page_ids(client, **params)
+        ids += page
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+
+def test_cursor_round_trip_covers_every_session_once(client):
+    rows = [(f"s{i:02d}", BASE_TS + timedelta(minutes=i)) for i in range(7)]
+    _add_sessions(rows)
+
+    ids, pages = _walk(client, limit=3)
+
+    assert ids == [session_id for session_id, _ in reversed(rows)]
+    assert pages == 3
+
+
+def test_ties_on_updated_at_are_ordered_by_id(client):
+    # Five sessions share one timestamp, so page boundaries fall inside the tie
+    tied = [(f"t{i}", BASE_TS) for i in range(5)]
+    _add_sessions(tied + [("newer", BASE_TS + timedelta(seconds=1))])
+
+    ids, _ = _walk(client, limit=2)
+
+    assert ids == ["newer", "t4", "t3", "t2", "t1", "t0"]
+
+
+def test_default_limit_is_50(client):
+    _add_sessions((f"s{i:02d}", BASE_TS + timedelta(seconds=i)) for i in range(55))
+
+    first, cursor = _page_ids(client)
+    rest, last_cursor = _page_ids(client, cursor=cursor)
+
+    assert len(first) == 50
+    assert len(rest) == 5
+    assert last_cursor is None
+
+
+@pytest.mark.parametrize("limit, status", [(0, 422), (1, 200), (200, 200), (201, 422)])
+def test_limit_bounds(client, limit, status):
+    assert client.get("/api/sessions", params={"limit": limit}).status_code == status
+
+
+@pytest.mark.parametrize(
+    "cursor", ["garbage", "not-a-date|s01", BASE_TS.isoformat(), f"{BASE_TS.isoformat()}|"]
+)
+def test_malformed_cursor_is_rejected(client, cursor):
+    resp = client.get("/api/sessions", params={"cursor": cursor})
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "Invalid cursor"
@@ -1,58 +1,85 @@
 from pathlib import Path
-from uuid import uuid4
+import asyncio
+import functools
+import hashlib
 import os
+import tempfile
 
 # Use a relative path for portability
 UPLOAD_DIR = Path("./uploads")
 LOGOS_DIR = UPLOAD_DIR / "logos"
+# In-progress copies live beside (not under) the served uploads dir, on the same
+# filesystem so the final os.replace is an atomic rename
+UPLOAD_TMP_DIR = Path("./temp_uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 LOGOS_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
 
-async def save_upload_to_disk(upload_file) -> dict:
+# Copy uploads in fixed-size chunks so memory stays flat regardless of file size
+CHUNK_SIZE = 1024 * 1024
+
+def _copy_to_disk(src, directory: Path, prefix: str, ext: str) -> tuple[Path, int]:
+    """Blocking chunked copy into content-addressed storage; returns (path, bytes).
+
+    The name is derived from the content hash, so re-uploading the same file
+    (e.g. the same logo every turn) reuses the existing copy.
+    """
+    src.seek(0)
+    h = hashlib.blake2b(digest_size=16)
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_TMP_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := src.read(CHUNK_SIZE):
+                h.update(chunk)
+                out.write(chunk)
+            size = out.tell()
+
+        fpath = directory / f"{prefix}{h.hexdigest()}{ext}"
+        if fpath.exists():
+            os.unlink(tmp)
+        else:
+            os.replace(tmp, fpath)
+        return fpath, size
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+@functools.lru_cache(maxsize=None)
+def _public_base_url() -> str:
+    """Base URL for upload links; resolved on first use, after .env has been loaded."""
+    # Create URL - use Railway URL in production, localhost in development
+    # Railway automatically sets RAILWAY_PUBLIC_DOMAIN environment variable
+    if os.getenv("RAILWAY_PUBLIC_DOMAIN"):
+        # Production on Railway
+        return f"https://{os.getenv('RAILWAY_PUBLIC_DOMAIN')}"
+    if os.getenv("RAILWAY_STATIC_URL"):
+        # Alternative Railway URL
+        return os.getenv("RAILWAY_STATIC_URL")
+    # Development (localhost)
+    return "http://localhost:8000"
+
+async def _stream_upload(upload_file, directory: Path, prefix: str = "") -> tuple[Path, int]:
+    """Stream an UploadFile to disk off the event loop."""
     ext = Path(upload_file.filename or "").suffix or ""
-    fname = f"{uuid4().hex}{ext}"
-    fpath = UPLOAD_DIR / fname
+    return await asyncio.to_thread(_copy_to_disk, upload_file.file, directory, prefix, ext)
 
-    with fpath.open("wb") as out:
-        while True:
-            chunk = await upload_file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
+async def save_upload_to_disk(upload_file) -> dict:
+    fpath, size = await _stream_upload(upload_file, UPLOAD_DIR)
 
     return {
         "name": upload_file.filename,
         "mime": upload_file.content_type or "application/octet-stream",
-        "size": fpath.stat().st_size,
+        "size": size,
         "path": str(fpath),
     }
 
 async def save_logo_to_disk(upload_file, session_id: str = None) -> dict:
     """Save logo file to logos directory, create URL, and store in database."""
-    ext = Path(upload_file.filename or "").suffix or ""
-    fname = f"logo_{uuid4().hex}{ext}"
-    fpath = LOGOS_DIR / fname
-
-    with fpath.open("wb") as out:
-        while True:
-            chunk = await upload_file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
+    fpath, size = await _stream_upload(upload_file, LOGOS_DIR, "logo_")
+    fname = fpath.name
 
-    # Create URL for the logo - use Railway URL in production, localhost in development
-    # Railway automatically sets RAILWAY_PUBLIC_DOMAIN environment variable
-    if os.getenv("RAILWAY_PUBLIC_DOMAIN"):
-        # Production on Railway
-        base_url = f"https://{os.getenv('RAILWAY_PUBLIC_DOMAIN')}"
-    elif os.getenv("RAILWAY_STATIC_URL"):
-        # Alternative Railway URL
-        base_url = os.getenv("RAILWAY_STATIC_URL")
-    else:
-        # Development (localhost)
-        base_url = "http://localhost:8000"
-    
-    logo_url = f"{base_url}/uploads/logos/{fname}"
+    logo_url = f"{_public_base_url()}/uploads/logos/{fname}"
     
     print(f"🖼️ Logo URL generated: {logo_url}")
     
@@ -60,7 +87,7 @@ async def save_logo_to_disk(upload_file, session_id: str = None) -> dict:
     logo_data = {
         "name": upload_file.filename,
         "mime": upload_file.content_type or "application/octet-stream",
-        "size": fpath.stat().st_size,
+        "size": size,
         "path": str(fpath),
         "url": logo_url,
         "filename": fname
@@ -87,7 +114,7 @@ async def save_logo_to_disk(upload_file, session_id: str = None) -> dict:
                     file_path=str(fpath),
                     url=logo_url,
                     mime_type=upload_file.content_type or "application/octet-stream",
-                    file_size=fpath.stat().st_size,
+                    file_size=size,
                     meta={"upload_timestamp": datetime.now().isoformat()}
                 )
                 db.add(logo_record)
@@ -100,26 +127,11 @@ async def save_logo_to_disk(upload_file, session_id: str = None) -> dict:
 
 async def save_image_to_disk(upload_file, session_id: str = None) -> dict:
     """Save image file to uploads directory, create URL, and store in database."""
-    ext = Path(upload_file.filename or "").suffix or ""
-    fname = f"image_{uuid4().hex}{ext}"
-    fpath = UPLOAD_DIR / fname  # Save to main uploads directory
-
-    with fpath.open("wb") as out:
-        while True:
-            chunk = await upload_file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
+    # Save to main uploads directory
+    fpath, size = await _stream_upload(upload_file, UPLOAD_DIR, "image_")
+    fname = fpath.name
 
-    # Create URL for the image
-    if os.getenv("RAILWAY_PUBLIC_DOMAIN"):
-        base_url = f"https://{os.getenv('RAILWAY_PUBLIC_DOMAIN')}"
-    elif os.getenv("RAILWAY_STATIC_URL"):
-        base_url = os.getenv("RAILWAY_STATIC_URL")
-    else:
-        base_url = "http://localhost:8000"
-    
-    image_url = f"{base_url}/uploads/{fname}"
+    image_url = f"{_public_base_url()}/uploads/{fname}"
     
     print(f"🖼️ Image URL generated: {image_url}")
     
@@ -127,7 +139,7 @@ async def save_image_to_disk(upload_file, session_id: str = None) -> dict:
     image_data = {
         "name": upload_file.filename,
         "mime": upload_file.content_type or "application/octet-stream",
-        "size": fpath.stat().st_size,
+        "size": size,
         "path": str(fpath),
         "url": image_url,
         "filename": fname
@@ -154,7 +166,7 @@ async def save_image_to_disk(upload_file, session_id: str = None) -> dict:
                     file_path=str(fpath),
                     url=image_url,
                     mime_type=upload_file.content_type or "application/octet-stream",
-                    file_size=fpath.stat().st_size,
+                    file_size=size,
                     meta={"upload_timestamp": datetime.now().isoformat()}
                 )
                 db.add(image_record)